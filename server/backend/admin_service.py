@@ -1,13 +1,16 @@
 from flask import Blueprint, jsonify, request, session
 from db_connect import get_connection
 import mysql.connector
-import csv
-import io
 import string
 import secrets
 import bcrypt
 import os
 import random
+import student_features
+import result_cache
+import csv_ingest
+from password_hashing import hash_password, hash_passwords
+from utils import invalidate_principals
 
 def get_val(row_dict, *keys):
     """Robust helper to find column values (BOM-safe, case-insensitive, trimmed)"""
@@ -36,9 +39,72 @@ def generate_random_password(length=8):
     alphabet = string.ascii_letters + string.digits
     return ''.join(secrets.choice(alphabet) for _ in range(length))
 
-def hash_password(password):
-    rounds = int(os.environ.get("BCRYPT_ROUNDS", 12))
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+# Rows per IN (...) lookup / bulk statement in batch uploads
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", 500))
+
+def chunked(values, size=IMPORT_CHUNK_SIZE):
+    return csv_ingest.chunked(values, size)
+
+def find_existing_users(cur, emails):
+    """Map lower-cased email -> users.id for every email that already has an account."""
+    found = {}
+    for chunk in chunked(emails):
+        fmt = ",".join(["%s"] * len(chunk))
+        cur.execute(f"SELECT id, email FROM users WHERE email IN ({fmt})", chunk)
+        for user_id, email in cur.fetchall():
+            found[email.lower()] = user_id
+    return found
+
+def find_student_ids(cur, user_ids):
+    """Map users.id -> students.student_id for users that already have a student record."""
+    found = {}
+    for chunk in chunked(user_ids):
+        fmt = ",".join(["%s"] * len(chunk))
+        cur.execute(f"SELECT user_id, student_id FROM students WHERE user_id IN ({fmt})", chunk)
+        for user_id, student_id in cur.fetchall():
+            found.setdefault(user_id, student_id)
+    return found
+
+def student_id_prefix(email):
+    return email.split('@')[0].upper()[:8]
+
+def find_taken_student_ids(cur, prefixes):
+    """Upper-cased student IDs already in the table that start with any of the prefixes."""
+    found = set()
+    for chunk in chunked(prefixes):
+        patterns = [p.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%" for p in chunk]
+        cur.execute("SELECT student_id FROM students WHERE " + " OR ".join(["student_id LIKE %s"] * len(chunk)), patterns)
+        found.update(row[0].upper() for row in cur.fetchall())
+    return found
+
+def new_student_id(prefix, taken):
+    """Pick a free <prefix><100-999> ID (comparing case-insensitively, like MySQL) and reserve it in taken."""
+    for _ in range(20):
+        s_id = f"{prefix}{random.randint(100, 999)}"
+        if s_id not in taken:
+            break
+    else:
+        free = [f"{prefix}{n}" for n in range(100, 1000) if f"{prefix}{n}" not in taken]
+        if not free:
+            raise ValueError(f"No free student ID left for prefix '{prefix}'")
+        s_id = random.choice(free)
+    taken.add(s_id)
+    return s_id
+
+def find_subjects(cur, departments):
+    """Map (department, semester), lower-cased, -> subject ids for every course in the given departments."""
+    found = {}
+    for chunk in chunked(departments):
+        fmt = ",".join(["%s"] * len(chunk))
+        cur.execute(f"SELECT id, department, semester FROM subjects WHERE department IN ({fmt})", chunk)
+        for sub_id, dept, sem in cur.fetchall():
+            found.setdefault(((dept or "").lower(), (sem or "").lower()), []).append(sub_id)
+    return found
+
+def executemany_chunked(cur, sql, rows, size=IMPORT_CHUNK_SIZE):
+    """executemany() in chunks; mysql-connector sends each INSERT chunk as one multi-row VALUES statement."""
+    for chunk in chunked(rows, size):
+        cur.executemany(sql, chunk)
 
 @admin_bp.route("/api/admin/stats", methods=["GET"])
 def get_dashboard_stats():
@@ -142,6 +208,7 @@ def add_faculty():
         )
         
         conn.commit()
+        invalidate_principals()
         cur.close()
         return jsonify({"message": "Faculty account created successfully"}), 201
     except mysql.connector.Error as err:
@@ -162,6 +229,7 @@ def delete_faculty(faculty_id):
         cur = conn.cursor()
         cur.execute("DELETE FROM faculties WHERE id = %s", (faculty_id,))
         conn.commit()
+        invalidate_principals()
         cur.close()
         return jsonify({"message": "Faculty deleted successfully"})
     except mysql.connector.Error as err:
@@ -196,6 +264,7 @@ def update_faculty(faculty_id):
         """, (name, department, designation, faculty_id))
         
         conn.commit()
+        invalidate_principals()
         cur.close()
         return jsonify({"message": "Faculty updated successfully"})
     except mysql.connector.Error as err:
@@ -250,72 +319,68 @@ def batch_upload_faculties():
 
     conn = get_connection()
     try:
-        # Using utf-8-sig to automatically handle BOM if present
-        content = file.stream.read().decode("utf-8-sig", errors="ignore")
-        if not content.strip():
+        # Decoded as it is read (BOM-safe); the delimiter is sniffed from the first chunk
+        reader, sep = csv_ingest.open_csv(file.stream, errors="ignore")
+        if not reader.fieldnames or not any(f.strip() for f in reader.fieldnames):
             return jsonify({"error": "The uploaded file is empty."}), 400
 
-        # Delimiter detection: Excel in some regions uses ';' instead of ','
-        sep = ','
-        first_line = content.split('\n')[0]
-        if ';' in first_line and (',' not in first_line or first_line.count(';') > first_line.count(',')):
-            sep = ';'
-        elif '\t' in first_line:
-            sep = '\t'
-
-        stream = io.StringIO(content, newline=None)
-        csv_input = csv.DictReader(stream, delimiter=sep)
-        rows = list(csv_input)
-
         print(f"\n--- [DEBUG] Batch Faculty Upload Started ---")
         print(f"Delimiter: '{sep}'")
-        print(f"Total Rows: {len(rows)}")
-        if rows:
-            headers = [str(k).strip() for k in rows[0].keys() if k is not None]
-            print(f"Detected Headers: {headers}")
+        print(f"Detected Headers: {[str(k).strip() for k in reader.fieldnames]}")
 
         cur = conn.cursor()
         credentials_list = []
         processed_count = 0
+        row_count = 0
+        seen_emails = set()
         
-        for i, row in enumerate(rows):
-            # Log raw row for debugging if needed (mask password/hash)
-            # print(f"Row {i+2} raw keys: {list(row.keys())}")
-
-            email = get_val(row, "email")
-            name = get_val(row, "name", "full name")
-            dept = get_val(row, "department", "dept")
-            designation = get_val(row, "designation", "role")
-            
-            if not email or not name:
-                print(f"Row {i+2}: SKIPPED (email='{email}', name='{name}')")
-                continue
-
-            print(f"Row {i+2}: Processing {email} ({name})")
-
-            # Check existing
-            cur.execute("SELECT id FROM users WHERE email=%s", (email,))
-            if cur.fetchone():
-                print(f"  User already exists, skipping.")
-                continue 
+        rows = enumerate(csv_ingest.iter_rows(reader))
+        for chunk in chunked(rows):
+            row_count += len(chunk)
+            parsed_rows = []
+            for i, row in chunk:
+                email = get_val(row, "email")
+                name = get_val(row, "name", "full name")
+                dept = get_val(row, "department", "dept")
+                designation = get_val(row, "designation", "role")
                 
-            # Create User (Consistent with single add_faculty)
-            temp_pwd = generate_random_password()
-            hashed_pwd = hash_password(temp_pwd)
-            cur.execute(
+                if not email or not name:
+                    print(f"Row {i+2}: SKIPPED (email='{email}', name='{name}')")
+                    continue
+                parsed_rows.append((i, email, name, dept, designation))
+
+            # Resolve the chunk's existing accounts in one IN (...) query instead of one per row
+            existing_users = find_existing_users(cur, {r[1] for r in parsed_rows})
+
+            new_faculties = []
+            for i, email, name, dept, designation in parsed_rows:
+                print(f"Row {i+2}: Processing {email} ({name})")
+
+                # Check existing
+                if email.lower() in existing_users or email.lower() in seen_emails:
+                    print(f"  User already exists, skipping.")
+                    continue 
+                seen_emails.add(email.lower())
+                new_faculties.append((email, name, dept, designation, generate_random_password()))
+
+            # Hash every temporary password up front (in parallel), then write
+            hashes = hash_passwords([f[4] for f in new_faculties])
+
+            # Create Users (Consistent with single add_faculty) and faculty rows in bulk
+            executemany_chunked(cur,
                 "INSERT INTO users (email, password_hash, role, provider, must_change_password) VALUES (%s, %s, 'FACULTY', 'password', TRUE)",
-                (email, hashed_pwd)
+                [(f[0], hashed_pwd) for f, hashed_pwd in zip(new_faculties, hashes)]
             )
-            
-            cur.execute("""
+            executemany_chunked(cur, """
                 INSERT INTO faculties (name, email, department, designation)
                 VALUES (%s, %s, %s, %s)
-            """, (name, email, dept, designation))
-            
-            credentials_list.append({"email": email, "password": temp_pwd})
-            processed_count += 1
+            """, [(name, email, dept, designation) for email, name, dept, designation, _ in new_faculties])
+            credentials_list.extend({"email": f[0], "password": f[4]} for f in new_faculties)
+            processed_count += len(new_faculties)
 
+        print(f"Total Rows: {row_count}")
         conn.commit()
+        invalidate_principals()
         print(f"--- [DEBUG] Batch Faculty Upload Complete. Processed: {processed_count} ---")
         return jsonify({"message": "Batch processed successfully", "credentials": credentials_list})
     except Exception as e:
@@ -356,132 +421,147 @@ def batch_upload_students():
 
     conn = get_connection()
     try:
-        stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-        csv_input = csv.DictReader(stream)
-        rows = list(csv_input)
-        
-        cur = conn.cursor(dictionary=True)
-        
-        # Pre-Validation Pass
-        unique_combinations = set()
-        for i, row in enumerate(rows, start=2): # Start at 2 to account for header
-            dept = row.get("department", "").strip()
-            sem = row.get("semester", "").strip()
-            if dept and sem:
-                unique_combinations.add((dept, sem, i))
-                
-        # Validate that each dept/sem combination has at least one subject
-        # for dept, sem, row_num in unique_combinations:
-        #     cur.execute("SELECT COUNT(*) as count FROM subjects WHERE department=%s AND semester=%s", (dept, sem))
-        #     count = cur.fetchone()['count']
-        #     if count == 0:
-        #         return jsonify({"error": f"Row {row_num} specifies Department '{dept}' and Semester '{sem}', but no courses exist for this combination. Upload blocked."}), 400
-        # Robust global get_val is used below
+        # Decoded as it is read and handled IMPORT_CHUNK_SIZE rows at a time
+        reader, sep = csv_ingest.open_csv(file.stream)
 
         print(f"\n--- [DEBUG] Batch Student Upload Started ---")
-        print(f"Total Rows: {len(rows)}")
-        if rows:
-            headers = [str(k).strip() for k in rows[0].keys() if k is not None]
-            print(f"Detected Headers: {headers}")
+        if reader.fieldnames:
+            print(f"Detected Headers: {[str(k).strip() for k in reader.fieldnames]}")
 
         cur = conn.cursor()
-        credentials_list = []
         processed_count = 0
         skipped_count = 0
+        row_count = 0
+        user_ids = {}     # lower-cased email -> users.id, for every account seen so far
+        student_ids = {}  # users.id -> student_id
+        credentials = {}  # lower-cased email -> credentials entry for accounts this upload created
+        subject_index = {}
+        indexed_depts = set()
+        taken_ids = set()         # upper-cased student IDs in the table or created by this upload
+        checked_prefixes = set()
         
-        for i, row in enumerate(rows):
-            email = get_val(row, "email")
-            name = get_val(row, "name", "full name")
-            dept = get_val(row, "department", "dept")
-            sem = get_val(row, "semester", "sem")
-            sgpa_str = get_val(row, "sgpa")
-            backlogs_str = get_val(row, "backlogs")
-            
-            try:
-                sgpa = float(sgpa_str) if sgpa_str else 0.0
-            except:
-                sgpa = 0.0
-            try:
-                backlogs = int(backlogs_str) if backlogs_str else 0
-            except:
-                backlogs = 0
-            
-            if not email or not name:
-                print(f"Row {i+2}: SKIPPED (email='{email}', name='{name}')")
-                skipped_count += 1
-                continue
-
-            print(f"Row {i+2}: Processing {email} ({name}) - {dept}, Sem {sem}")
-
-            # Check existing user
-            cur.execute("SELECT id, role FROM users WHERE email=%s", (email,))
-            existing_user = cur.fetchone()
-            
-            user_id = None
-            s_id = None
-            is_new = False
-            
-            if existing_user:
-                user_id = existing_user[0]
-                print(f"  Existing user found (ID: {user_id})")
-                cur.execute("SELECT student_id FROM students WHERE user_id=%s", (user_id,))
-                student_row = cur.fetchone()
-                if student_row:
-                    s_id = student_row[0]
-                    print(f"  Existing student record: {s_id}")
-                cur.execute("UPDATE users SET role='STUDENT' WHERE id=%s", (user_id,))
-            else:
-                print(f"  Creating new user...")
-                temp_pwd = generate_random_password()
-                hashed_pwd = hash_password(temp_pwd)
-                cur.execute("INSERT INTO users (email, password_hash, role, must_change_password) VALUES (%s, %s, 'STUDENT', TRUE)",
-                            (email, hashed_pwd))
-                user_id = cur.lastrowid
-                is_new = True
-                credentials_list.append({"email": email, "password": temp_pwd, "student_id": ""}) 
-
-            # Risk calculation
-            risk_score = 0
-            if sgpa < 6.5: risk_score += 30
-            if backlogs > 0: risk_score += 30
-            risk_level = "High" if risk_score >= 60 else ("Medium" if risk_score >= 30 else "Low")
-            
-            if not s_id:
-                # New student record
-                prefix = email.split('@')[0].upper()[:8]
-                s_id = f"{prefix}{random.randint(100, 999)}"
-                print(f"  Inserting student: {s_id}")
-                cur.execute("""
-                    INSERT INTO students (student_id, user_id, name, department, semester, sgpa, backlogs, risk_score, risk_level)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (s_id, user_id, name, dept, sem, sgpa, backlogs, risk_score, risk_level))
-            else:
-                # Existing student record update
-                print(f"  Updating student: {s_id}")
-                cur.execute("""
-                    UPDATE students 
-                    SET name=%s, department=%s, semester=%s, sgpa=%s, backlogs=%s, risk_score=%s, risk_level=%s
-                    WHERE student_id=%s
-                """, (name, dept, sem, sgpa, backlogs, risk_score, risk_level, s_id))
-            
-            if is_new:
-                for cred in credentials_list:
-                    if cred["email"] == email:
-                        cred["student_id"] = s_id
-                        break
-            
-            # Auto-assign courses for this dept/sem
-            cur.execute("SELECT id FROM subjects WHERE department=%s AND semester=%s", (dept, sem))
-            subjects = cur.fetchall()
-            print(f"  Assigned {len(subjects)} subjects for {dept} semester {sem}")
-            for sub in subjects:
-                cur.execute("""
-                    INSERT IGNORE INTO student_academic_records (student_id, subject_id, attendance_percentage, internal_marks, assignment_score)
-                    VALUES (%s, %s, 100, 0, 0)
-                """, (s_id, sub[0]))
-            
-            processed_count += 1
+        rows = enumerate(csv_ingest.iter_rows(reader))
+        for chunk in chunked(rows):
+            row_count += len(chunk)
+            parsed_rows = []
+
+            # Pass 1: parse rows
+            for i, row in chunk:
+                email = get_val(row, "email")
+                name = get_val(row, "name", "full name")
+                dept = get_val(row, "department", "dept")
+                sem = get_val(row, "semester", "sem")
+                sgpa_str = get_val(row, "sgpa")
+                backlogs_str = get_val(row, "backlogs")
+                
+                try:
+                    sgpa = float(sgpa_str) if sgpa_str else 0.0
+                except:
+                    sgpa = 0.0
+                try:
+                    backlogs = int(backlogs_str) if backlogs_str else 0
+                except:
+                    backlogs = 0
+                
+                if not email or not name:
+                    print(f"Row {i+2}: SKIPPED (email='{email}', name='{name}')")
+                    skipped_count += 1
+                    continue
+
+                parsed_rows.append((i, email, name, dept, sem, sgpa, backlogs))
+
+            # Resolve existing users and their student records in a few IN (...) queries
+            found = find_existing_users(cur, {r[1] for r in parsed_rows if r[1].lower() not in user_ids})
+            user_ids.update(found)
+            student_ids.update(find_student_ids(cur, set(found.values())))
+            new_accounts = []
+            for _, email, *_ in parsed_rows:
+                if email.lower() not in user_ids and email.lower() not in credentials:
+                    credentials[email.lower()] = {"email": email, "password": generate_random_password(), "student_id": ""}
+                    new_accounts.append(credentials[email.lower()])
+
+            # Hash every temporary password up front (in parallel), then create the accounts in bulk
+            hashes = hash_passwords(c["password"] for c in new_accounts)
+            print(f"  Creating {len(new_accounts)} new users...")
+            executemany_chunked(cur, "INSERT INTO users (email, password_hash, role, must_change_password) VALUES (%s, %s, 'STUDENT', TRUE)",
+                                [(c["email"], h) for c, h in zip(new_accounts, hashes)])
+            user_ids.update(find_existing_users(cur, [c["email"] for c in new_accounts]))
+
+            # Courses for every department in the file, loaded once for auto-enrolment
+            new_depts = {r[3] for r in parsed_rows if r[3]} - indexed_depts
+            for key, ids in find_subjects(cur, new_depts).items():
+                subject_index.setdefault(key, []).extend(ids)
+            indexed_depts |= new_depts
+
+            # Existing IDs for the prefixes new students will use, so generated IDs never clash
+            new_prefixes = {student_id_prefix(r[1]) for r in parsed_rows
+                            if not student_ids.get(user_ids[r[1].lower()])} - checked_prefixes
+            taken_ids |= find_taken_student_ids(cur, new_prefixes)
+            checked_prefixes |= new_prefixes
+
+            # Pass 2: buffer the student writes, flushed below in IMPORT_CHUNK_SIZE statements
+            new_students = {}     # student_id -> INSERT values; a repeated row just replaces them
+            student_updates = []
+            enrolments = []
+            touched_ids = []
+            for i, email, name, dept, sem, sgpa, backlogs in parsed_rows:
+                print(f"Row {i+2}: Processing {email} ({name}) - {dept}, Sem {sem}")
+
+                user_id = user_ids[email.lower()]
+                s_id = student_ids.get(user_id)
+
+                # Risk calculation
+                risk_score = 0
+                if sgpa < 6.5: risk_score += 30
+                if backlogs > 0: risk_score += 30
+                risk_level = "High" if risk_score >= 60 else ("Medium" if risk_score >= 30 else "Low")
+                
+                if s_id in new_students:
+                    new_students[s_id] = (s_id, user_id, name, dept, sem, sgpa, backlogs, risk_score, risk_level)
+                elif not s_id:
+                    # New student record
+                    s_id = new_student_id(student_id_prefix(email), taken_ids)
+                    print(f"  Inserting student: {s_id}")
+                    new_students[s_id] = (s_id, user_id, name, dept, sem, sgpa, backlogs, risk_score, risk_level)
+                    student_ids[user_id] = s_id
+                    if email.lower() in credentials:
+                        credentials[email.lower()]["student_id"] = s_id
+                else:
+                    # Existing student record update
+                    print(f"  Updating student: {s_id}")
+                    student_updates.append((name, dept, sem, sgpa, backlogs, risk_score, risk_level, s_id))
+                
+                # Auto-assign courses for this dept/sem
+                subjects = subject_index.get((dept.lower(), sem.lower()), [])
+                print(f"  Assigned {len(subjects)} subjects for {dept} semester {sem}")
+                enrolments.extend((s_id, sub_id) for sub_id in subjects)
+                if subjects:
+                    touched_ids.append(s_id)
+                
+                processed_count += 1
 
+            existing_user_ids = list(found.values())
+            if existing_user_ids:
+                fmt = ",".join(["%s"] * len(existing_user_ids))
+                cur.execute(f"UPDATE users SET role='STUDENT' WHERE id IN ({fmt})", existing_user_ids)
+            executemany_chunked(cur, """
+                INSERT INTO students (student_id, user_id, name, department, semester, sgpa, backlogs, risk_score, risk_level)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, list(new_students.values()))
+            executemany_chunked(cur, """
+                UPDATE students 
+                SET name=%s, department=%s, semester=%s, sgpa=%s, backlogs=%s, risk_score=%s, risk_level=%s
+                WHERE student_id=%s
+            """, student_updates)
+            executemany_chunked(cur, """
+                INSERT IGNORE INTO student_academic_records (student_id, subject_id, attendance_percentage, internal_marks, assignment_score)
+                VALUES (%s, %s, 100, 0, 0)
+            """, enrolments)
+            student_features.refresh(cur, touched_ids)
+
+        credentials_list = list(credentials.values())
+        print(f"Total Rows: {row_count}")
+        result_cache.bump_data_version(cur)
         conn.commit()
         print(f"--- [DEBUG] Batch Upload Complete. Processed: {processed_count}, Skipped: {skipped_count} ---")
         return jsonify({
@@ -597,7 +677,9 @@ def add_single_student():
                     INSERT IGNORE INTO student_academic_records (student_id, subject_id, attendance_percentage, internal_marks, assignment_score)
                     VALUES (%s, %s, 100, 0, 0)
                 """, (s_id, sub_id))
+            student_features.refresh(cur, [s_id])
 
+        result_cache.bump_data_version(cur)
         conn.commit()
         msg = "Student updated successfully" if is_update else "Student created successfully"
         return jsonify({"message": msg, "credentials": {"email": email, "password": temp_pwd if not existing_user else "Existing User"}})
@@ -647,7 +729,9 @@ def update_student(student_id):
                     INSERT INTO student_academic_records (student_id, subject_id, attendance_percentage, internal_marks, assignment_score)
                     VALUES (%s, %s, 100, 0, 0)
                 """, (student_id, sub_id))
+            student_features.refresh(cur, [student_id])
 
+        result_cache.bump_data_version(cur)
         conn.commit()
         return jsonify({"message": "Student updated successfully"})
     except Exception as e:
@@ -675,8 +759,10 @@ def delete_student(student_id):
         # Assuming FK cascade on students.user_id -> users.id is there? 
         # Actually it's safer to delete both.
         cur.execute("DELETE FROM student_academic_records WHERE student_id=%s", (student_id,))
+        student_features.refresh(cur, [student_id])
         cur.execute("DELETE FROM students WHERE student_id=%s", (student_id,))
         cur.execute("DELETE FROM users WHERE id=%s", (user_id,))
+        result_cache.bump_data_version(cur)
         
         conn.commit()
         return jsonify({"message": "Student deleted successfully"})
@@ -870,7 +956,10 @@ def rename_department(old_name):
         cur.execute("UPDATE students SET department=%s WHERE department=%s", (new_name, old_name))
         cur.execute("UPDATE faculties SET department=%s WHERE department=%s", (new_name, old_name))
         cur.execute("UPDATE subjects SET department=%s WHERE department=%s", (new_name, old_name))
+        result_cache.bump_data_version(cur)
         conn.commit()
+        # Cached principals hold the old department name
+        invalidate_principals()
         return jsonify({"message": f"Department renamed to {new_name}"})
     except Exception as e:
         conn.rollback()
@@ -1,31 +1,247 @@
-from flask import Blueprint, jsonify, session
+from flask import Blueprint, jsonify, request, session
+from werkzeug.http import http_date
+from db_connect import get_connection
+import scoring_jobs
+import drift_monitor
+import result_cache
 import random
 import os
-import joblib
+import hashlib
+import functools
 import numpy as np
+from model_registry import ModelWatcher, list_versions, set_current, current_version, current_meta
+from utils import check_admin, get_faculty_department
+from risk_engine import (
+    FEATURES, build_feature_matrix, score_batch, simulate_batch, persist_scores,
+    compute_fingerprints, dirty_mask, reason_flags, render_reasons, high_risk_contributions, top_drivers
+)
 
 ai_bp = Blueprint('ai_bp', __name__)
 
-# Load Model and Scaler
+# Legacy Model and Scaler, used only until a version is published to the registry
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "models", "risk_model.pkl")
 SCALER_PATH = os.path.join(os.path.dirname(__file__), "models", "scaler.pkl")
 
-model = None
-scaler = None
+# Rows written per staged bulk UPDATE when persisting risk results
+PERSIST_CHUNK_SIZE = int(os.environ.get("AI_PERSIST_CHUNK_SIZE", 1000))
 
-if os.path.exists(MODEL_PATH) and os.path.exists(SCALER_PATH):
+# Registry models are hot-swapped between runs when models/registry/CURRENT moves
+model_watcher = ModelWatcher(poll_seconds=float(os.environ.get("AI_MODEL_POLL_SECONDS", 2)))
+
+
+@functools.lru_cache(maxsize=1)
+def _load_legacy_model():
+    """Unpickle the legacy sklearn model once; returns (model, scaler, version)."""
+    if os.path.exists(MODEL_PATH) and os.path.exists(SCALER_PATH):
+        try:
+            import joblib
+            model = joblib.load(MODEL_PATH)
+            scaler = joblib.load(SCALER_PATH)
+            digest = hashlib.sha1()
+            for path in (MODEL_PATH, SCALER_PATH):
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+            version = digest.hexdigest()[:12]
+            print(f"AI Model and Scaler loaded successfully (version {version}).")
+            return model, scaler, version
+        except Exception as e:
+            print(f"Error loading AI models: {e}")
+    # No model at all: rule-based simulation
+    return None, None, "simulation"
+
+
+def active_model():
+    """
+    Model to use for one scoring run, as (model, scaler, version).
+    Callers take a single snapshot so a hot swap never mixes models mid-run.
+    """
+    bundle = model_watcher.get()
+    if bundle is None:
+        return _load_legacy_model()
+    if bundle.feature_names != FEATURES:
+        raise ValueError(f"Model {bundle.version} expects features {bundle.feature_names}, not {FEATURES}")
+    return bundle, None, bundle.version
+
+
+def run_risk_analysis(dept_filter=None):
+    """
+    Advanced AI analysis engine that computes weighted risk scores and 
+    generates personalized academic interventions.
+    Returns the dashboard payload; with no students in scope it is just
+    {"empty": True} plus the versions, so the snapshot still counts as fresh.
+    Runs outside the request cycle, so it takes the department scope explicitly.
+    """
+    # 1. Fetch Students with deep academic history
+    query = """
+        SELECT 
+            s.student_id, s.name, s.department, s.semester, s.risk_level, 
+            COALESCE(s.risk_score, 0) as risk_score, s.sgpa, s.backlogs, s.risk_fingerprint,
+            f.avg_attendance as avg_att,
+            f.avg_marks as avg_marks,
+            f.avg_assignment as avg_assignment
+        FROM students s
+        LEFT JOIN student_features f ON f.student_id = s.student_id
+    """
+    
+    params = []
+    if dept_filter:
+        query += " WHERE s.department = %s"
+        params.append(dept_filter)
+    
+    conn = get_connection()
     try:
-        model = joblib.load(MODEL_PATH)
-        scaler = joblib.load(SCALER_PATH)
-        print("AI Model and Scaler loaded successfully.")
-    except Exception as e:
-        print(f"Error loading AI models: {e}")
+        cur = conn.cursor(dictionary=True)
+        # Read in the same snapshot as the students, so the payload is tagged with exactly the data it saw
+        data_version = result_cache.data_version(cur)
+        cur.execute(query, tuple(params))
+        students = cur.fetchall()
+        cur.close()
+    finally:
+        # Hand the read connection back to the pool before scoring
+        conn.close()
+    
+    if not students:
+        return {"empty": True, "model_version": active_model()[2], "data_version": data_version}
+
+    # 2. Advanced Risk Reasoning Engine (Real ML Model)
+    # Only students whose inputs or model changed since their last run are rescored
+    model, scaler, model_version = active_model()
+    X = build_feature_matrix(students)
+    risk_levels = np.array([s['risk_level'] for s in students], dtype=object)
+    risk_scores = np.array([float(s['risk_score']) for s in students])
+    dirty = dirty_mask(students, compute_fingerprints(X, model_version, risk_levels, risk_scores))
+
+    if dirty.any():
+        # Score the dirty set in one pass; fall back to simulation if model is not loaded
+        if model is not None:
+            risk_levels[dirty], risk_scores[dirty] = score_batch(model, scaler, X[dirty])
+        else:
+            risk_levels[dirty], risk_scores[dirty] = simulate_batch(X[dirty])
+
+    for i, s in enumerate(students):
+        s['risk_level'] = str(risk_levels[i])
+        s['risk_score'] = float(risk_scores[i])
+        s.pop('risk_fingerprint', None)
+
+    # Fold only the rows rescored this run into the drift histograms; unchanged
+    # students were already counted when they were last scored, so overlapping
+    # scopes and repeated polls don't count them again
+    drift_monitor.monitor.observe(
+        X[dirty], [s['department'] or "Unassigned" for s, d in zip(students, dirty) if d],
+        risk_levels[dirty], model_version
+    )
+
+    # Generate AI Reasons (Explainability) as one batch stage: rule flags for
+    # everyone, tree-path drivers and rendered text only for the High-risk
+    # rows the payload returns
+    high_idx = np.flatnonzero(risk_levels == 'High')
+    flags = reason_flags(X)
+    contributions = high_risk_contributions(model, X[high_idx])
+    high_risk_triggers = []
+    for j, i in enumerate(high_idx):
+        s = students[i]
+        s['ai_reasons'] = render_reasons(X[i], flags[i], s['sgpa'])
+        s['risk_drivers'] = top_drivers(contributions[j]) if contributions is not None else []
+        high_risk_triggers.append(s)
+
+    # 3. Persist AI Results to DB in chunked bulk writes (dirty rows only)
+    if dirty.any():
+        conn = get_connection()
+        try:
+            persist_scores(
+                conn,
+                [s['student_id'] for s, d in zip(students, dirty) if d],
+                risk_levels[dirty], risk_scores[dirty],
+                fingerprints=compute_fingerprints(X[dirty], model_version, risk_levels[dirty], risk_scores[dirty]),
+                model_version=model_version,
+                chunk_size=PERSIST_CHUNK_SIZE
+            )
+        finally:
+            conn.close()
+    drift_monitor.monitor.maybe_flush(get_connection)
+
+    # 4. Aggregated Insights Engine
+    total = len(students)
+    high_risk = len(high_risk_triggers)
+    dept_risk = {}
+    for s in students:
+        dept = s['department'] or "Unassigned"
+        if dept not in dept_risk: dept_risk[dept] = {"count": 0, "total": 0}
+        dept_risk[dept]["total"] += 1
+        if s['risk_level'] == 'High': dept_risk[dept]["count"] += 1
+
+    insights = []
+    # Insight 1: Concentration
+    if dept_risk:
+        top_dept = max(dept_risk.items(), key=lambda x: x[1]['count']/x[1]['total'] if x[1]['total']>0 else 0)
+        if top_dept[1]['count'] > 0:
+            insights.append(f"The {top_dept[0]} department shows a higher risk density ({round((top_dept[1]['count']/top_dept[1]['total'])*100)}%). Targeted academic support is advised for this group.")
+
+    # Insight 2: Attendance correlation
+    low_att_high_risk = len([s for s in high_risk_triggers if float(s['avg_att'] or 100) < 75])
+    if high_risk > 0:
+        corr = (low_att_high_risk / high_risk) * 100
+        if corr > 60:
+            insights.append(f"Strong Correlation Detected: {round(corr)}% of High-Risk students also have sub-75% attendance. Attendance is the leading risk indicator.")
+
+    # Insight 3: Predicted Trend
+    potential_migration = len([s for s in students if float(s['avg_marks'] or 25) < 14 and s['risk_level'] != 'High'])
+    if potential_migration > 0:
+        insights.append(f"AI Projection: Based on current internal marks, {potential_migration} additional students may migrate to Medium/High risk by semester end.")
+
+    # 5. Final Payload
+    return {
+        "summary": {
+            "total_students": total,
+            "high_risk_count": high_risk,
+            "avg_risk_score": round(sum(float(s['risk_score']) for s in students)/total, 1) if total > 0 else 0
+        },
+        "distribution": [
+            {"name": "Low Risk", "value": len([s for s in students if s['risk_level'] == 'Low']), "color": "#10B981"},
+            {"name": "Medium Risk", "value": len([s for s in students if s['risk_level'] == 'Medium']), "color": "#F59E0B"},
+            {"name": "High Risk", "value": high_risk, "color": "#EF4444"}
+        ],
+        "insights": insights,
+        "high_risk_students": high_risk_triggers,
+        "model_version": model_version,
+        "data_version": data_version
+    }
+
+
+def _resolve_scope(conn, role):
+    """Department the caller may analyse (None means every department)."""
+    if role == "FACULTY":
+        return get_faculty_department(conn)
+    return None
+
+
+def _job_response(job):
+    return {
+        "job_id": job['id'],
+        "status": job['status'],
+        "created_at": job['created_at'],
+        "started_at": job['started_at'],
+        "finished_at": job['finished_at'],
+        "error": job['error'],
+    }
+
+
+def _is_empty(payload):
+    """True for a run that found no students (older snapshots stored None)."""
+    return payload is None or payload.get("empty", False)
+
+
+def _cache_entry(payload, job):
+    """Cached form of a finished snapshot; the timestamp is pre-rendered the way jsonify would."""
+    return {"payload": payload, "job_id": job['id'], "generated_at": http_date(job['finished_at'])}
+
 
 @ai_bp.route('/api/ai/predict', methods=['GET', 'POST'])
 def predict_risk():
     """
-    Advanced AI analysis engine that computes weighted risk scores and 
-    generates personalized academic interventions.
+    Return the last completed risk analysis for the caller's scope immediately.
+    A refresh is queued only when that analysis is older than the current data
+    or model; nothing here waits on the model.
     """
     user_id = session.get("user_id")
     role = session.get("role")
@@ -35,159 +251,44 @@ def predict_risk():
         
     conn = None
     try:
-        from db_connect import get_connection
         conn = get_connection()
+        dept_filter = _resolve_scope(conn, role)
         cur = conn.cursor(dictionary=True)
-        
-        # Determine department filter for faculty
-        dept_filter = None
-        if role == "FACULTY":
-            cur.execute("SELECT department FROM faculties WHERE email = (SELECT email FROM users WHERE id = %s)", (user_id,))
-            f_row = cur.fetchone()
-            dept_filter = f_row['department'] if f_row and f_row['department'] else None
-        
-        # 1. Fetch Students with deep academic history
-        query = """
-            SELECT 
-                s.student_id, s.name, s.department, s.semester, s.risk_level, 
-                COALESCE(s.risk_score, 0) as risk_score, s.sgpa, s.backlogs,
-                AVG(sar.attendance_percentage) as avg_att,
-                AVG(sar.internal_marks) as avg_marks,
-                AVG(sar.assignment_score) as avg_assignment
-            FROM students s
-            LEFT JOIN student_academic_records sar ON s.student_id = sar.student_id
-        """
-        
-        params = []
-        if dept_filter:
-            query += " WHERE s.department = %s"
-            params.append(dept_filter)
-            
-        query += " GROUP BY s.student_id"
-        
-        cur.execute(query, tuple(params))
-        students = cur.fetchall()
-        
-        if not students:
-            return jsonify({"error": "No data found"}), 404
+        data_version = result_cache.data_version(cur)
+        cur.close()
+        model_version = active_model()[2]
+        key = result_cache.cache_key(scoring_jobs.scope_key(dept_filter), model_version, data_version)
 
-        # 2. Advanced Risk Reasoning Engine (Real ML Model)
-        analyzed_students = []
-        high_risk_triggers = []
-        
-        for s in students:
-            # Fallback to simulation if model is not loaded
-            if model and scaler:
-                # Features: ['attendance_percentage', 'internal_marks', 'assignment_score', 'sgpa', 'backlogs']
-                features = np.array([[
-                    float(s['avg_att'] or 0),
-                    float(s['avg_marks'] or 0),
-                    float(s['avg_assignment'] or 0),
-                    float(s['sgpa'] or 0),
-                    int(s['backlogs'] or 0)
-                ]])
-                
-                features_scaled = scaler.transform(features)
-                prediction = model.predict(features_scaled)[0]
-                probabilities = model.predict_proba(features_scaled)[0]
-                
-                # Risk Score based on High/Medium proba
-                # Class orders vary, but usually 0:High, 1:Low, 2:Medium (alphabetic)
-                # Let's derive a simple score from proba
-                risk_level = str(prediction)
-                
-                # Update local state
-                s['risk_level'] = risk_level
-                # Score is probability of needing intervention
-                # We'll use a weighted score for the UI
-                classes = model.classes_.tolist()
-                p_high = float(probabilities[classes.index('High')]) if 'High' in classes else 0.0
-                p_med = float(probabilities[classes.index('Medium')]) if 'Medium' in classes else 0.0
-                s['risk_score'] = float(round((p_high * 100) + (p_med * 40), 1))
-            else:
-                # Simulation fallback logic
-                att = float(s['avg_att'] or 0)
-                marks = float(s['avg_marks'] or 0)
-                if att < 75 or marks < 14 or s['backlogs'] > 1:
-                    s['risk_level'] = 'High'
-                    s['risk_score'] = 85.0
-                elif att < 85:
-                    s['risk_level'] = 'Medium'
-                    s['risk_score'] = 45.0
-                else:
-                    s['risk_level'] = 'Low'
-                    s['risk_score'] = 12.0
-
-            # Generate AI Reasons (Explainability)
-            reasons = []
-            att = float(s['avg_att'] or 0)
-            marks = float(s['avg_marks'] or 0)
-            backlogs = int(s['backlogs'] or 0)
-            
-            if att < 75: reasons.append(f"Critical attendance deficit ({att:.1f}%)")
-            if marks < 15: reasons.append(f"Low internal assessment performance ({marks:.1f}/25)")
-            if backlogs > 1: reasons.append(f"Active backlog accumulation ({backlogs} subjects)")
-            if s['sgpa'] < 6.5: reasons.append(f"Sustained SGPA depression ({s['sgpa']})")
-            
-            s['ai_reasons'] = reasons or ["Stable performance detected"]
-            
-            # 3. Persist AI Results to DB
-            cur.execute("""
-                UPDATE students 
-                SET risk_level = %s, risk_score = %s 
-                WHERE student_id = %s
-            """, (s['risk_level'], s['risk_score'], s['student_id']))
-            
-            analyzed_students.append(s)
-            if s['risk_level'] == 'High':
-                high_risk_triggers.append(s)
-
-        conn.commit()
-
-        # 4. Aggregated Insights Engine
-        total = len(students)
-        high_risk = len(high_risk_triggers)
-        dept_risk = {}
-        for s in students:
-            dept = s['department'] or "Unassigned"
-            if dept not in dept_risk: dept_risk[dept] = {"count": 0, "total": 0}
-            dept_risk[dept]["total"] += 1
-            if s['risk_level'] == 'High': dept_risk[dept]["count"] += 1
-
-        insights = []
-        # Insight 1: Concentration
-        if dept_risk:
-            top_dept = max(dept_risk.items(), key=lambda x: x[1]['count']/x[1]['total'] if x[1]['total']>0 else 0)
-            if top_dept[1]['count'] > 0:
-                insights.append(f"The {top_dept[0]} department shows a higher risk density ({round((top_dept[1]['count']/top_dept[1]['total'])*100)}%). Targeted academic support is advised for this group.")
-
-        # Insight 2: Attendance correlation
-        low_att_high_risk = len([s for s in high_risk_triggers if float(s['avg_att'] or 100) < 75])
-        if high_risk > 0:
-            corr = (low_att_high_risk / high_risk) * 100
-            if corr > 60:
-                insights.append(f"Strong Correlation Detected: {round(corr)}% of High-Risk students also have sub-75% attendance. Attendance is the leading risk indicator.")
-
-        # Insight 3: Predicted Trend
-        potential_migration = len([s for s in students if float(s['avg_marks'] or 25) < 14 and s['risk_level'] != 'High'])
-        if potential_migration > 0:
-            insights.append(f"AI Projection: Based on current internal marks, {potential_migration} additional students may migrate to Medium/High risk by semester end.")
-
-        # 5. Final Payload
-        return jsonify({
-            "summary": {
-                "total_students": total,
-                "high_risk_count": high_risk,
-                "avg_risk_score": round(sum(float(s['risk_score']) for s in students)/total, 1) if total > 0 else 0
-            },
-            "distribution": [
-                {"name": "Low Risk", "value": len([s for s in students if s['risk_level'] == 'Low']), "color": "#10B981"},
-                {"name": "Medium Risk", "value": len([s for s in students if s['risk_level'] == 'Medium']), "color": "#F59E0B"},
-                {"name": "High Risk", "value": high_risk, "color": "#EF4444"}
-            ],
-            "insights": insights,
-            "high_risk_students": [s for s in analyzed_students if s['risk_level'] == 'High']
-        })
+        entry = result_cache.cache.get(key)
+        job = None
+        if entry is None:
+            snapshot = scoring_jobs.latest_snapshot(conn, dept_filter)
+            fresh = False
+            if snapshot is not None:
+                payload, snapshot_job = snapshot
+                entry = _cache_entry(payload, snapshot_job)
+                # Scored from the current data with the current model: serve it as is from now on
+                fresh = (payload is not None and payload.get("model_version") == model_version
+                         and payload.get("data_version") == data_version)
+                if fresh:
+                    result_cache.cache.put(key, entry)
+            if not fresh:
+                job = scoring_jobs.enqueue(conn, dept_filter, run_risk_analysis)
+
+        if entry is None:
+            # First run for this scope: hand back the job so the client can poll it
+            return jsonify(_job_response(job)), 202
+
+        if _is_empty(entry["payload"]):
+            return jsonify({"error": "No data found"}), 404
+        # Copy: the cached payload is shared between requests
+        payload = dict(entry["payload"])
+        payload["snapshot"] = {
+            "job_id": entry["job_id"],
+            "generated_at": entry["generated_at"],
+            "refresh_job_id": job['id'] if job else None,
+        }
+        return jsonify(payload)
 
     except Exception as e:
         import traceback
@@ -195,3 +296,152 @@ def predict_risk():
         return jsonify({"error": str(e)}), 500
     finally:
         if conn: conn.close()
+
+
+@ai_bp.route('/api/ai/jobs', methods=['POST'])
+def enqueue_risk_job():
+    """Queue a risk scoring run for the caller's scope."""
+    user_id = session.get("user_id")
+    role = session.get("role")
+    
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    conn = None
+    try:
+        conn = get_connection()
+        dept_filter = _resolve_scope(conn, role)
+        job = scoring_jobs.enqueue(conn, dept_filter, run_risk_analysis)
+        return jsonify(_job_response(job)), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if conn: conn.close()
+
+
+def _load_scoped_job(conn, job_id):
+    """Fetch a job only if it belongs to the caller's scope."""
+    dept_filter = _resolve_scope(conn, session.get("role"))
+    job = scoring_jobs.get_job(conn, job_id)
+    if not job or job['scope'] != scoring_jobs.scope_key(dept_filter):
+        return None
+    return job
+
+
+@ai_bp.route('/api/ai/jobs/<int:job_id>', methods=['GET'])
+def get_risk_job(job_id):
+    if not session.get("user_id"):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    conn = None
+    try:
+        conn = get_connection()
+        job = _load_scoped_job(conn, job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(_job_response(job))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if conn: conn.close()
+
+
+@ai_bp.route('/api/ai/jobs/<int:job_id>/result', methods=['GET'])
+def get_risk_job_result(job_id):
+    if not session.get("user_id"):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    conn = None
+    try:
+        conn = get_connection()
+        job = _load_scoped_job(conn, job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        if job['status'] == 'failed':
+            return jsonify({"error": job['error'] or "Risk scoring failed"}), 500
+        if job['status'] != 'done':
+            return jsonify(_job_response(job)), 409
+        payload = scoring_jobs.job_result(job)
+        if _is_empty(payload):
+            return jsonify({"error": "No data found"}), 404
+        return jsonify(payload)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if conn: conn.close()
+
+
+# --- MODEL REGISTRY (ADMIN) ---
+
+@ai_bp.route('/api/admin/ai/models', methods=['GET'])
+def get_models():
+    is_admin, msg, code = check_admin()
+    if not is_admin:
+        return jsonify({"error": msg}), code
+    try:
+        return jsonify({"current": current_version(), "versions": list_versions()})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@ai_bp.route('/api/admin/ai/models/current', methods=['PUT'])
+def set_current_model():
+    """Roll the served model forward or back; workers pick it up on their next poll."""
+    is_admin, msg, code = check_admin()
+    if not is_admin:
+        return jsonify({"error": msg}), code
+
+    data = request.json or {}
+    version = (data.get("version") or "").strip()
+    if not version:
+        return jsonify({"error": "Version is required"}), 400
+    try:
+        set_current(version)
+        return jsonify({"message": f"Model version {version} activated", "current": version})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@ai_bp.route('/api/admin/ai/drift', methods=['GET'])
+def get_drift():
+    """
+    Drift of live inputs and predictions from the live model's training data,
+    over the last `days` days (optionally one `department`).
+    """
+    is_admin, msg, code = check_admin()
+    if not is_admin:
+        return jsonify({"error": msg}), code
+
+    days = request.args.get("days", 7, type=int)
+    department = request.args.get("department") or None
+    meta = current_meta()
+    reference = ((meta or {}).get("training") or {}).get("reference")
+    if not reference:
+        return jsonify({"error": "The live model has no training reference; retrain it to record one"}), 404
+
+    version = current_version()
+    conn = None
+    try:
+        conn = get_connection()
+        features, classes = drift_monitor.load_window(conn, version, days, department)
+        mix = drift_monitor.department_mix(conn, version, days)
+        # Include this worker's window that has not been flushed yet
+        pending_features, pending_classes = drift_monitor.monitor.window(version, department)
+        report = drift_monitor.drift_report(reference, features + pending_features, classes + pending_classes)
+        report.update({"model_version": version, "days": days, "department": department})
+        report["departments"] = sorted((
+            {
+                "department": dept,
+                "rows": int(counts.sum()),
+                "psi": round(drift_monitor.psi(reference["classes"], counts) or 0, 4),
+                "live": dict(zip(drift_monitor.CLASSES, drift_monitor.shares(counts))),
+            }
+            for dept, counts in mix.items()
+        ), key=lambda d: -(d["psi"] or 0))
+        return jsonify(report)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if conn: conn.close()
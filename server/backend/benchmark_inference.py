@@ -0,0 +1,66 @@
+"""
+benchmark_inference.py
+Compares throughput of the legacy per-student scoring loop against the
+batched risk_engine path (sklearn and compiled forest) using the shipped
+model and scaler.
+
+Usage: python benchmark_inference.py [num_students ...]
+"""
+
+import os
+import sys
+import time
+import joblib
+import numpy as np
+from forest_compiler import compile_forest, build_meta, CompiledForest
+from risk_engine import FEATURES, score_batch, score_rows_individually
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+
+
+def make_features(n, seed=42):
+    """Random feature rows spanning the ranges seen in production."""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.uniform(40, 100, n),   # attendance
+        rng.uniform(5, 25, n),     # internal marks
+        rng.uniform(3, 10, n),     # assignment score
+        rng.uniform(4, 10, n),     # sgpa
+        rng.integers(0, 6, n),     # backlogs
+    ]).astype(np.float64)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [100, 1000, 8000]
+
+    model = joblib.load(os.path.join(MODELS_DIR, "risk_model.pkl"))
+    scaler = joblib.load(os.path.join(MODELS_DIR, "scaler.pkl"))
+    arrays = compile_forest(model, scaler)
+    compiled = CompiledForest(arrays, build_meta(arrays, model.classes_, FEATURES))
+
+    print(f"{'students':>10} {'per-row (s)':>12} {'batched (s)':>12} {'compiled (s)':>13} "
+          f"{'rows/s per-row':>15} {'rows/s batched':>15} {'rows/s compiled':>16}")
+    for n in sizes:
+        X = make_features(n)
+        (row_levels, row_scores), t_row = timed(score_rows_individually, model, scaler, X)
+        (batch_levels, batch_scores), t_batch = timed(score_batch, model, scaler, X)
+        (comp_levels, comp_scores), t_comp = timed(score_batch, compiled, None, X)
+
+        # All paths must agree before the numbers mean anything
+        assert np.array_equal(row_levels, batch_levels), "risk levels differ between paths"
+        assert np.allclose(row_scores, batch_scores), "risk scores differ between paths"
+        assert np.array_equal(batch_levels, comp_levels), "compiled forest disagrees with sklearn"
+        assert np.array_equal(batch_scores, comp_scores), "compiled forest disagrees with sklearn"
+
+        print(f"{n:>10} {t_row:>12.3f} {t_batch:>12.3f} {t_comp:>13.4f} "
+              f"{n / t_row:>15.0f} {n / t_batch:>15.0f} {n / t_comp:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
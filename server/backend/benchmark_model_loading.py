@@ -0,0 +1,136 @@
+"""
+benchmark_model_loading.py
+Measures per-worker memory for the ways a serving process can load the risk
+model: unpickling the sklearn forest with joblib, loading the registry bundle
+into private memory, and memory-mapping the bundle (the default).
+
+Each mode starts N fresh processes, as a multi-worker deployment would. Every
+worker loads the model, scores a batch so the arrays are actually touched,
+then reports RSS and PSS from /proc/self/smaps_rollup before and after the
+load while all N workers are still alive. PSS splits shared pages between
+the processes mapping them, so it is the number that shows page-cache sharing.
+
+The shipped forest is small; --trees builds a larger synthetic forest so the
+difference is visible at realistic model sizes. Linux only.
+
+Usage: python benchmark_model_loading.py [--workers 4] [--trees 300]
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+import multiprocessing as mp
+import joblib
+import numpy as np
+from forest_compiler import compile_forest, save_bundle, load_bundle
+from risk_engine import FEATURES, score_batch
+from benchmark_inference import make_features
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+SMAPS_PATH = "/proc/self/smaps_rollup"
+MODES = ("pickle", "bundle-copy", "bundle-mmap")
+
+
+def memory_kb():
+    """(rss, pss) of the calling process in kB."""
+    values = {}
+    with open(SMAPS_PATH) as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key] = int(rest.split()[0])
+    return values["Rss"], values["Pss"]
+
+
+def load_model(mode, workdir):
+    if mode == "pickle":
+        return (joblib.load(os.path.join(workdir, "risk_model.pkl")),
+                joblib.load(os.path.join(workdir, "scaler.pkl")))
+    bundle = load_bundle(os.path.join(workdir, "bundle"), mmap_mode="r" if mode == "bundle-mmap" else None)
+    return bundle, None
+
+
+def worker(mode, workdir, barrier, results):
+    # Import sklearn up front in every mode so only the model itself is measured
+    import sklearn.ensemble  # noqa: F401
+    X = make_features(2000, seed=os.getpid())
+    before = memory_kb()
+    model, scaler = load_model(mode, workdir)
+    score_batch(model, scaler, X)
+    # Measure only once every worker holds the model, so shared pages are split N ways
+    barrier.wait()
+    after = memory_kb()
+    results.put((before, after))
+    barrier.wait()
+
+
+def run_mode(mode, workdir, workers):
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, workdir, barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    samples = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return samples
+
+
+def build_large_model(n_trees, seed=0):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+    X = make_features(50000, seed=seed)
+    # Roughly the rule set used for synthetic training data, with label noise
+    rng = np.random.default_rng(seed)
+    y = np.where((X[:, 0] < 75) | (X[:, 1] < 14) | (X[:, 4] > 1), "High",
+                 np.where(X[:, 0] < 85, "Medium", "Low"))
+    flip = rng.random(len(y)) < 0.1
+    y[flip] = rng.choice(["High", "Medium", "Low"], flip.sum())
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=n_trees, random_state=seed, n_jobs=-1)
+    model.fit(scaler.transform(X), y)
+    return model, scaler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--trees", type=int, default=0,
+                        help="train a synthetic forest with this many trees instead of using models/*.pkl")
+    args = parser.parse_args()
+
+    if not os.path.exists(SMAPS_PATH):
+        sys.exit("This benchmark needs /proc/self/smaps_rollup (Linux 4.14+).")
+
+    if args.trees:
+        model, scaler = build_large_model(args.trees)
+    else:
+        model = joblib.load(os.path.join(MODELS_DIR, "risk_model.pkl"))
+        scaler = joblib.load(os.path.join(MODELS_DIR, "scaler.pkl"))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        joblib.dump(model, os.path.join(workdir, "risk_model.pkl"))
+        joblib.dump(scaler, os.path.join(workdir, "scaler.pkl"))
+        arrays = compile_forest(model, scaler)
+        save_bundle(os.path.join(workdir, "bundle"), arrays, model.classes_, FEATURES)
+        bundle_mb = sum(a.nbytes for a in arrays.values()) / 2**20
+        pickle_mb = os.path.getsize(os.path.join(workdir, "risk_model.pkl")) / 2**20
+        print(f"Forest: {len(model.estimators_)} trees, pickle {pickle_mb:.1f} MB, "
+              f"bundle arrays {bundle_mb:.1f} MB, {args.workers} workers\n")
+
+        print(f"{'mode':>12} {'RSS before':>11} {'RSS after':>10} {'PSS after':>10} "
+              f"{'+RSS/worker':>12} {'+PSS/worker':>12} {'+PSS total':>11}")
+        for mode in MODES:
+            samples = run_mode(mode, workdir, args.workers)
+            rss_before = np.mean([b[0] for b, _ in samples]) / 1024
+            rss_after = np.mean([a[0] for _, a in samples]) / 1024
+            pss_after = np.mean([a[1] for _, a in samples]) / 1024
+            pss_delta = np.mean([a[1] - b[1] for b, a in samples]) / 1024
+            print(f"{mode:>12} {rss_before:>9.1f}MB {rss_after:>8.1f}MB {pss_after:>8.1f}MB "
+                  f"{rss_after - rss_before:>10.1f}MB {pss_delta:>10.1f}MB {pss_delta * args.workers:>9.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+benchmark_password_hashing.py
+Compares rows/second of hashing batch-upload passwords one at a time against
+password_hashing.hash_passwords() on the thread pool.
+
+Set BCRYPT_ROUNDS / BCRYPT_WORKERS to match production; at the default 12
+rounds the 10k-row serial run takes several minutes on a small machine.
+
+Usage: python benchmark_password_hashing.py [num_rows ...]
+"""
+
+import sys
+import time
+import bcrypt
+from password_hashing import BCRYPT_ROUNDS, WORKERS, hash_password, hash_passwords
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [100, 1000, 10000]
+    print(f"bcrypt rounds: {BCRYPT_ROUNDS}, workers: {WORKERS}")
+
+    # Start the pool outside the timings, as a running server would have it already
+    hash_passwords(["warm-up"] * WORKERS * 2)
+
+    print(f"{'rows':>8} {'serial (s)':>11} {'pool (s)':>10} {'rows/s serial':>14} {'rows/s pool':>12} {'speedup':>8}")
+    for n in sizes:
+        passwords = [f"pw{i:08d}" for i in range(n)]
+        serial, t_serial = timed(lambda p: [hash_password(x) for x in p], passwords)
+        pooled, t_pool = timed(hash_passwords, passwords)
+
+        # Results must stay in input order or credentials would go to the wrong accounts
+        assert len(pooled) == n
+        assert all(bcrypt.checkpw(p.encode("utf-8"), h.encode("utf-8"))
+                   for p, h in zip(passwords[:20], pooled[:20])), "hash order mismatch"
+
+        print(f"{n:>8} {t_serial:>11.2f} {t_pool:>10.2f} {n / t_serial:>14.1f} "
+              f"{n / t_pool:>12.1f} {t_serial / t_pool:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
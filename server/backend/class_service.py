@@ -1,7 +1,8 @@
 from flask import Blueprint, jsonify, request, session
 from db_connect import get_connection
 import mysql.connector
-from utils import check_admin, generate_student_id
+import result_cache
+from utils import check_admin, generate_student_id, invalidate_principals
 
 class_bp = Blueprint("classes", __name__)
 
@@ -94,6 +95,7 @@ def delete_class(class_id):
         cur.execute("UPDATE faculties SET class_id = NULL WHERE class_id = %s", (class_id,))
         cur.execute("DELETE FROM classes WHERE id = %s", (class_id,))
         conn.commit()
+        invalidate_principals()
         cur.close()
         return jsonify({"message": "Class deleted"})
     except mysql.connector.Error as err:
@@ -122,6 +124,7 @@ def assign_faculty(class_id):
         if faculty_id:
             cur.execute("UPDATE faculties SET class_id = %s WHERE id = %s", (class_id, faculty_id))
         conn.commit()
+        invalidate_principals()
         cur.close()
         return jsonify({"message": "Faculty assigned to class"})
     except mysql.connector.Error as err:
@@ -209,6 +212,7 @@ def add_student_to_class(class_id):
             attendance, internal_marks, assignment_score,
             sgpa, backlogs, risk_score, risk_level, class_id
         ))
+        result_cache.bump_data_version(cur)
         conn.commit()
         cur.close()
         return jsonify({"message": "Student added to class", "student_id": student_id}), 201
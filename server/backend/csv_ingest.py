@@ -0,0 +1,69 @@
+"""
+csv_ingest.py
+Streams CSV uploads row by row instead of reading the whole file into memory.
+
+The upload's byte stream is decoded incrementally through a TextIOWrapper, the
+delimiter is sniffed from the first chunk only, and rows come out one at a
+time with normalized headers, so memory stays flat up to nginx's 50M
+client_max_body_size. Pair with chunked() to hand rows to a writer in batches.
+
+Usage:
+    reader, sep = open_csv(request.files['file'].stream)
+    for chunk in chunked(iter_rows(reader), 500):
+        ...
+"""
+
+import io
+import csv
+import itertools
+
+# Enough text to hold the header line of any roster we accept
+SNIFF_SIZE = 64 * 1024
+
+
+def sniff_delimiter(sample):
+    """Excel in some regions writes ';' instead of ','; some exports use tabs."""
+    first_line = sample.split('\n')[0]
+    if ';' in first_line and (',' not in first_line or first_line.count(';') > first_line.count(',')):
+        return ';'
+    if '\t' in first_line:
+        return '\t'
+    return ','
+
+
+def open_csv(stream, errors="strict", sniff_size=SNIFF_SIZE):
+    """
+    Wrap a binary upload stream in a csv.DictReader that decodes as it reads.
+    Returns (reader, delimiter); reader.fieldnames is None for an empty file.
+    """
+    # utf-8-sig drops a BOM if present; newline="" lets csv handle quoted line breaks
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors=errors, newline="")
+    sample = text.read(sniff_size)
+    if sample and not sample.endswith(("\n", "\r")):
+        sample += text.readline()   # finish the line the sample cut through
+    sep = sniff_delimiter(sample)
+    lines = itertools.chain(io.StringIO(sample, newline=""), text)
+    return csv.DictReader(lines, delimiter=sep), sep
+
+
+def normalize_row(row):
+    """Lower-case, trim and BOM-strip the headers; trim the values."""
+    return {
+        str(k).lower().strip().replace('\ufeff', ''): (str(v).strip() if v is not None else "")
+        for k, v in row.items() if k is not None
+    }
+
+
+def iter_rows(reader):
+    for row in reader:
+        yield normalize_row(row)
+
+
+def chunked(values, size):
+    """Yield lists of up to size items from any iterable, without materializing it."""
+    it = iter(values)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
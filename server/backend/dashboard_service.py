@@ -1,9 +1,90 @@
 from flask import Blueprint, jsonify, request, session
 from db_connect import get_connection
 import mysql.connector
+import json
+import base64
+from decimal import Decimal
+import student_features
+import result_cache
+import csv_ingest
+from utils import get_principal, get_faculty_department
 
 dashboard_bp = Blueprint("dashboard", __name__)
 
+SUMMARY_SQL = """
+    SELECT COALESCE(s.department, '') AS dept,
+           COUNT(*) AS total,
+           SUM(f.attendance_sum) / SUM(f.attendance_count) AS avg_attendance,
+           AVG(s.sgpa) AS avg_sgpa,
+           SUM(s.risk_level = 'High') AS high_risk
+    FROM students s
+    LEFT JOIN student_features f ON f.student_id = s.student_id
+"""
+
+STUDENT_LIST_SQL = """
+    SELECT 
+        s.student_id, s.name, s.department, s.semester, u.email,
+        COALESCE(f.avg_attendance, 0) as attendance_percentage,
+        COALESCE(f.avg_marks, 0) as internal_marks, 
+        COALESCE(f.avg_assignment, 0) as assignment_score,
+        s.sgpa, s.backlogs, 
+        s.risk_score, s.risk_level,
+        NULL as subject_name,
+        s.created_at
+    FROM students s
+    LEFT JOIN users u ON s.user_id = u.id
+    LEFT JOIN student_features f ON f.student_id = s.student_id
+"""
+
+# Keyset orders for /api/students; student_id breaks ties so every row has a unique position.
+# Each is backed by a (department, ...) and an unscoped composite index (update_schema_ai.py).
+STUDENT_SORTS = {
+    "recent": {
+        "order": "s.created_at DESC, s.student_id DESC",
+        "after": "(s.created_at, s.student_id) < (%s, %s)",
+        "key": lambda row: [str(row['created_at']), row['student_id']],
+        "after_params": lambda key: (key[0], key[1]),
+    },
+    "risk": {
+        "order": "s.risk_score DESC, s.name ASC, s.student_id ASC",
+        # Mixed directions cannot use one row comparison, so expand it
+        "after": "(s.risk_score < %s OR (s.risk_score = %s AND (s.name > %s OR (s.name = %s AND s.student_id > %s))))",
+        "key": lambda row: ["%.2f" % row['risk_score'], row['name'], row['student_id']],
+        # Decimal keeps the comparison exact against the DECIMAL(5,2) column
+        "after_params": lambda key: (Decimal(key[0]), Decimal(key[0]), key[1], key[1], key[2]),
+    },
+}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def _encode_cursor(row, sort):
+    """Opaque cursor holding the sort key of the last row on a page."""
+    raw = json.dumps({"sort": sort, "key": STUDENT_SORTS[sort]["key"](row)})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor, sort):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(data, dict) or data.get("sort") != sort or not isinstance(data.get("key"), list):
+        raise ValueError("Invalid cursor")
+    return data["key"]
+
+def _like_prefix(text):
+    """LIKE pattern matching values that start with text, with wildcards escaped."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def _summary_fields(row):
+    """Dashboard summary numbers from one SUMMARY_SQL row (None means no students)."""
+    row = row or {}
+    return {
+        "total_students": int(row.get('total') or 0),
+        "avg_attendance": round(float(row['avg_attendance']), 1) if row.get('avg_attendance') is not None else 0.0,
+        "avg_sgpa": round(float(row['avg_sgpa']), 2) if row.get('avg_sgpa') is not None else 0.0,
+        "high_risk_students": int(row.get('high_risk') or 0)
+    }
+
 @dashboard_bp.route("/api/dashboard/summary", methods=["GET"])
 def get_summary():
     user_id = session.get("user_id")
@@ -19,51 +100,24 @@ def get_summary():
         
         dept_filter = None
         if role == "FACULTY":
-            cur.execute("SELECT department FROM faculties WHERE email = (SELECT email FROM users WHERE id = %s)", (user_id,))
-            f_row = cur.fetchone()
-            dept_filter = f_row['department'] if f_row and f_row['department'] else None
+            dept_filter = get_faculty_department(conn)
 
-        # Total Students
-        if dept_filter:
-            cur.execute("SELECT COUNT(*) as total FROM students WHERE department = %s", (dept_filter,))
-        else:
-            cur.execute("SELECT COUNT(*) as total FROM students")
-        total = cur.fetchone()['total']
-        
-        # Average Attendance
+        # One aggregation pass over students + their feature rows. Unscoped callers
+        # group by department WITH ROLLUP, so the same scan also yields the breakdown
+        # (the group key is never NULL, so the NULL row is the all-departments total)
         if dept_filter:
-            cur.execute("""
-                SELECT AVG(sar.attendance_percentage) as avg_attendance 
-                FROM student_academic_records sar
-                JOIN students s ON sar.student_id = s.student_id
-                WHERE s.department = %s
-            """, (dept_filter,))
+            cur.execute(SUMMARY_SQL + " WHERE s.department = %s", (dept_filter,))
         else:
-            cur.execute("SELECT AVG(attendance_percentage) as avg_attendance FROM student_academic_records")
-        row = cur.fetchone()
-        avg_attendance = float(row['avg_attendance']) if row and row['avg_attendance'] is not None else 0.0
-        
-        # Average SGPA
-        if dept_filter:
-            cur.execute("SELECT AVG(sgpa) as avg_sgpa FROM students WHERE department = %s", (dept_filter,))
-        else:
-            cur.execute("SELECT AVG(sgpa) as avg_sgpa FROM students")
-        row = cur.fetchone()
-        avg_sgpa = float(row['avg_sgpa']) if row and row['avg_sgpa'] is not None else 0.0
-        
-        # High Risk Count
-        if dept_filter:
-            cur.execute("SELECT COUNT(*) as high_risk FROM students WHERE risk_level = 'High' AND department = %s", (dept_filter,))
-        else:
-            cur.execute("SELECT COUNT(*) as high_risk FROM students WHERE risk_level = 'High'")
-        high_risk = cur.fetchone()['high_risk']
+            cur.execute(SUMMARY_SQL + " GROUP BY dept WITH ROLLUP")
+        rows = cur.fetchall()
+        overall = next((r for r in rows if dept_filter or r['dept'] is None), None)
         
-        summary = {
-            "total_students": total,
-            "avg_attendance": round(avg_attendance, 1),
-            "avg_sgpa": round(avg_sgpa, 2),
-            "high_risk_students": high_risk
-        }
+        summary = _summary_fields(overall)
+        if not dept_filter:
+            summary["departments"] = [
+                dict(department=r['dept'] or "Unassigned", **_summary_fields(r))
+                for r in rows if r['dept'] is not None
+            ]
         
         cur.close()
         return jsonify(summary)
@@ -88,9 +142,7 @@ def get_risk_distribution():
         
         dept_filter = None
         if role == "FACULTY":
-            cur.execute("SELECT department FROM faculties WHERE email = (SELECT email FROM users WHERE id = %s)", (user_id,))
-            f_row = cur.fetchone()
-            dept_filter = f_row['department'] if f_row and f_row['department'] else None
+            dept_filter = get_faculty_department(conn)
 
         if dept_filter:
             cur.execute("""
@@ -138,6 +190,13 @@ def get_risk_distribution():
 
 @dashboard_bp.route("/api/students", methods=["GET"])
 def get_students():
+    """
+    One keyset page of students in the caller's scope. Optional filters:
+    department (admins only), semester, risk_level, q (name or student ID
+    prefix). Sort: "recent" (admin default) or "risk" (faculty default).
+    limit defaults to DEFAULT_PAGE_SIZE; pass next_cursor back as cursor for
+    the following page (null on the last one).
+    """
     user_id = session.get("user_id")
     role = session.get("role")
     
@@ -145,55 +204,59 @@ def get_students():
         return jsonify({"error": "Unauthorized"}), 401
     if role not in ("ADMIN", "FACULTY"):
         return jsonify({"error": "Forbidden"}), 403
+
+    args = request.args
+    sort = args.get("sort") or ("recent" if role == "ADMIN" else "risk")
+    if sort not in STUDENT_SORTS:
+        return jsonify({"error": f"sort must be one of {', '.join(STUDENT_SORTS)}"}), 400
+    limit = min(args.get("limit", DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE)
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    after = None
+    if args.get("cursor"):
+        try:
+            after = _decode_cursor(args["cursor"], sort)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
         
     conn = None
     try:
         conn = get_connection()
         cur = conn.cursor(dictionary=True)
-        
-        if role == "ADMIN":
-            cur.execute("""
-                SELECT 
-                    s.student_id, s.name, s.department, s.semester, u.email,
-                    COALESCE(AVG(sar.attendance_percentage), 0) as attendance_percentage,
-                    COALESCE(AVG(sar.internal_marks), 0) as internal_marks, 
-                    COALESCE(AVG(sar.assignment_score), 0) as assignment_score,
-                    s.sgpa, s.backlogs, 
-                    s.risk_score, s.risk_level,
-                    NULL as subject_name
-                FROM students s
-                LEFT JOIN users u ON s.user_id = u.id
-                LEFT JOIN student_academic_records sar ON s.student_id = sar.student_id
-                GROUP BY s.student_id, s.name, s.department, s.semester, u.email, s.sgpa, s.backlogs, s.risk_score, s.risk_level
-                ORDER BY s.created_at DESC
-            """)
-            students = cur.fetchall()
-        elif role == "FACULTY":
+
+        where, params = [], []
+        if role == "FACULTY":
             # Get the faculty's department to show relevant students
-            cur.execute("SELECT department FROM faculties WHERE email = (SELECT email FROM users WHERE id = %s)", (user_id,))
-            f_row = cur.fetchone()
-            f_dept = f_row['department'] if f_row and f_row['department'] and f_row['department'].strip() else None
-            
-            if f_dept:
-                cur.execute("""
-                    SELECT 
-                        s.student_id, s.name, s.department, s.semester, u.email,
-                        COALESCE(AVG(sar.attendance_percentage), 0) as attendance_percentage,
-                        COALESCE(AVG(sar.internal_marks), 0) as internal_marks, 
-                        COALESCE(AVG(sar.assignment_score), 0) as assignment_score,
-                        s.sgpa, s.backlogs, 
-                        s.risk_score, s.risk_level,
-                        NULL as subject_name
-                    FROM students s
-                    LEFT JOIN users u ON s.user_id = u.id
-                    LEFT JOIN student_academic_records sar ON s.student_id = sar.student_id
-                    WHERE s.department = %s
-                    GROUP BY s.student_id, s.name, s.department, s.semester, u.email, s.sgpa, s.backlogs, s.risk_score, s.risk_level
-                    ORDER BY s.risk_score DESC, s.name ASC
-                """, (f_dept,))
-                students = cur.fetchall()
-            else:
-                students = []
+            f_dept = get_faculty_department(conn)
+            f_dept = f_dept if f_dept and f_dept.strip() else None
+            if not f_dept:
+                return jsonify({"students": [], "next_cursor": None, "limit": limit})
+            where.append("s.department = %s")
+            params.append(f_dept)
+        elif args.get("department"):
+            where.append("s.department = %s")
+            params.append(args["department"])
+        if args.get("semester"):
+            where.append("s.semester = %s")
+            params.append(args["semester"])
+        if args.get("risk_level"):
+            where.append("s.risk_level = %s")
+            params.append(args["risk_level"])
+        if args.get("q"):
+            where.append("(s.name LIKE %s OR s.student_id LIKE %s)")
+            params.extend([_like_prefix(args["q"])] * 2)
+        if after is not None:
+            where.append(STUDENT_SORTS[sort]["after"])
+            params.extend(STUDENT_SORTS[sort]["after_params"](after))
+
+        query = STUDENT_LIST_SQL
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        # One extra row tells us whether another page exists
+        query += " ORDER BY " + STUDENT_SORTS[sort]["order"] + " LIMIT %s"
+        params.append(limit + 1)
+        cur.execute(query, tuple(params))
+        students = cur.fetchall()
         
         # Format decimals/floats for JSON compatibility
         for student in students:
@@ -205,7 +268,13 @@ def get_students():
             student['backlogs'] = int(student['backlogs']) if student['backlogs'] is not None else 0
             
         cur.close()
-        return jsonify({"students": students, "total": len(students)})
+        next_cursor = None
+        if len(students) > limit:
+            students = students[:limit]
+            next_cursor = _encode_cursor(students[-1], sort)
+        for student in students:
+            student.pop('created_at', None)
+        return jsonify({"students": students, "next_cursor": next_cursor, "limit": limit})
     except Exception as err:
         return jsonify({"error": str(err)}), 500
     finally:
@@ -242,9 +311,7 @@ def add_student():
         
         if not existing_student:
             # Get faculty department for context
-            cur.execute("SELECT department FROM faculties WHERE email = (SELECT email FROM users WHERE id = %s)", (session.get("user_id"),))
-            f_row = cur.fetchone()
-            dept = f_row['department'] if f_row and f_row['department'] else ''
+            dept = get_faculty_department(conn) or ''
             
             # Create base student record
             cur.execute("""
@@ -269,7 +336,9 @@ def add_student():
                 attendance_percentage=%s, internal_marks=%s, assignment_score=%s
             """, (student_db_id, sub_id, att, internal_marks, assignment_score,
                 att, internal_marks, assignment_score))
+            student_features.refresh(cur, [student_db_id])
                 
+        result_cache.bump_data_version(cur)
         conn.commit()
         cur.close()
         return jsonify({"message": "Student record saved successfully"}), 201
@@ -322,22 +391,17 @@ def import_students():
     if file.filename == '':
         return jsonify({"error": "Empty filename"}), 400
 
-    import csv
-    import io
     import random
     
     try:
         # 1. Get faculty's department for auto-assignment
         conn = get_connection()
         cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT department FROM faculties WHERE email = (SELECT email FROM users WHERE id = %s)", (user_id,))
-        f_row = cur.fetchone()
-        f_dept = f_row['department'] if f_row and f_row['department'] else None
+        f_dept = get_faculty_department(conn)
         
-        # 2. Parse CSV
-        content = file.stream.read().decode("utf-8-sig") # Handle BOM
-        stream = io.StringIO(content)
-        csv_reader = csv.DictReader(stream)
+        # 2. Parse CSV as it streams in (BOM-safe, delimiter sniffed)
+        reader, _ = csv_ingest.open_csv(file.stream)
+        csv_reader = csv_ingest.iter_rows(reader)
         
         # Robust helper for column mapping
         def get_val(row_dict, *keys):
@@ -348,6 +412,7 @@ def import_students():
             return ""
 
         imported_count = 0
+        touched_ids = []
         for row in csv_reader:
             sid = get_val(row, 'student_id', 'id', 'student id')
             name = get_val(row, 'name', 'full name', 'student name')
@@ -398,9 +463,12 @@ def import_students():
                     VALUES (%s, %s, %s)
                     ON DUPLICATE KEY UPDATE attendance_percentage=%s
                 """, (s_db_id, sub_id, att, att))
+                touched_ids.append(s_db_id)
                 
             imported_count += 1
             
+        student_features.refresh(cur, touched_ids)
+        result_cache.bump_data_version(cur)
         conn.commit()
         cur.close()
         return jsonify({"message": f"Successfully imported {imported_count} records"}), 200
@@ -441,8 +509,8 @@ def get_my_summary():
             
         # Get overall attendance
         cur.execute("""
-            SELECT AVG(attendance_percentage) as avg_attendance
-            FROM student_academic_records
+            SELECT avg_attendance
+            FROM student_features
             WHERE student_id = %s
         """, (student['student_id'],))
         att_row = cur.fetchone()
@@ -516,15 +584,12 @@ def get_faculty_profile():
     conn = None
     try:
         conn = get_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT name, department, designation FROM faculties WHERE email = (SELECT email FROM users WHERE id = %s)", (user_id,))
-        faculty = cur.fetchone()
-        cur.close()
+        principal = get_principal(conn)
         
-        if not faculty:
+        if not principal or principal["faculty_id"] is None:
             return jsonify({"error": "Faculty record not found"}), 404
             
-        return jsonify(faculty)
+        return jsonify({key: principal[key] for key in ("name", "department", "designation")})
     except Exception as err:
         return jsonify({"error": str(err)}), 500
     finally:
@@ -0,0 +1,291 @@
+"""
+drift_monitor.py
+Streaming input and prediction drift statistics for the risk model.
+
+Every scoring run folds the rows it actually rescored (new or changed inputs,
+or a new model) and their predicted levels into fixed-bin histograms, one set
+per (model version, department), with a single bincount per run. Students
+skipped as unchanged are not counted again, so a window reflects scoring
+events, not how often dashboards were polled. Bins are fixed in advance, so windows from different workers and
+different flushes add up exactly, and memory is bounded by MAX_SLOTS x
+features x bins however many students are scored. Windows are flushed to
+`ai_drift_stats` every FLUSH_SECONDS.
+
+Training stores the same histograms of its data (reference_profile) in the
+bundle metadata, and drift is reported as the Population Stability Index
+between that reference and the live windows:
+    PSI = sum((live - ref) * ln(live / ref)) over bins
+with < 0.1 read as stable, 0.1-0.25 as moderate and > 0.25 as significant drift.
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+from datetime import datetime, timezone
+import numpy as np
+from risk_engine import FEATURES
+from training_snapshot import CLASSES
+
+# Inner bin edges per feature; values below the first / above the last edge land in the end bins
+BIN_EDGES = (
+    np.arange(10, 100, 10, dtype=np.float64),    # attendance %: 10 bins of 10
+    np.arange(2.5, 25, 2.5, dtype=np.float64),   # internal marks: 10 bins of 2.5
+    np.arange(1, 10, 1, dtype=np.float64),       # assignment score: 10 bins of 1
+    np.arange(1, 10, 1, dtype=np.float64),       # SGPA: 10 bins of 1
+    np.arange(0.5, 9, 1, dtype=np.float64),      # backlogs: 0 .. 8, then 9+
+)
+N_BINS = len(BIN_EDGES[0]) + 1
+FLUSH_SECONDS = int(os.environ.get("AI_DRIFT_FLUSH_SECONDS", 300))
+# (model version, department) windows kept in memory; extra departments share one slot
+MAX_SLOTS = 64
+OVERFLOW_DEPARTMENT = "Other"
+PSI_FLOOR = 1e-4
+MODERATE_PSI = 0.1
+SIGNIFICANT_PSI = 0.25
+
+
+def feature_histograms(X, groups=None, n_groups=1):
+    """
+    Bin counts of shape (n_groups, len(FEATURES), N_BINS), one bincount for the whole batch.
+    groups gives each row's group index (all rows in group 0 when omitted).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    bins = np.column_stack([np.searchsorted(BIN_EDGES[f], X[:, f], side="right") for f in range(len(FEATURES))])
+    flat = bins + np.arange(len(FEATURES)) * N_BINS
+    if groups is not None:
+        flat = flat + (np.asarray(groups) * (len(FEATURES) * N_BINS))[:, np.newaxis]
+    counts = np.bincount(flat.ravel(), minlength=n_groups * len(FEATURES) * N_BINS)
+    return counts.reshape(n_groups, len(FEATURES), N_BINS)
+
+
+def class_counts(levels, groups=None, n_groups=1):
+    """Predicted level counts of shape (n_groups, len(CLASSES))."""
+    codes = np.searchsorted(np.asarray(CLASSES), np.asarray(levels, dtype=str))
+    if groups is not None:
+        codes = codes + np.asarray(groups) * len(CLASSES)
+    return np.bincount(codes, minlength=n_groups * len(CLASSES)).reshape(n_groups, len(CLASSES))
+
+
+def reference_profile(X, y):
+    """Histograms of the training data, stored with the model as the drift baseline."""
+    return {
+        "rows": int(len(X)),
+        "features": feature_histograms(X)[0].tolist(),
+        "classes": class_counts(y)[0].tolist(),
+    }
+
+
+def merge_profiles(a, b):
+    """Sum two reference profiles (histograms over fixed bins add exactly)."""
+    return {
+        "rows": a["rows"] + b["rows"],
+        "features": (np.asarray(a["features"]) + np.asarray(b["features"])).tolist(),
+        "classes": (np.asarray(a["classes"]) + np.asarray(b["classes"])).tolist(),
+    }
+
+
+def psi(reference, live):
+    """Population Stability Index between two count vectors (empty bins floored to PSI_FLOOR)."""
+    ref = np.asarray(reference, dtype=np.float64)
+    cur = np.asarray(live, dtype=np.float64)
+    if ref.sum() == 0 or cur.sum() == 0:
+        return None
+    ref = np.clip(ref / ref.sum(), PSI_FLOOR, None)
+    cur = np.clip(cur / cur.sum(), PSI_FLOOR, None)
+    return float(np.sum((cur - ref) * np.log(cur / ref)))
+
+
+def status(value):
+    if value is None:
+        return "no data"
+    if value >= SIGNIFICANT_PSI:
+        return "significant"
+    if value >= MODERATE_PSI:
+        return "moderate"
+    return "stable"
+
+
+def shares(counts):
+    counts = np.asarray(counts, dtype=np.float64)
+    total = counts.sum()
+    return (counts / total).round(4).tolist() if total else [0.0] * len(counts)
+
+
+def drift_report(reference, features, classes):
+    """Per-feature and prediction-mix PSI of live counts against a reference profile."""
+    report = {"features": [], "reference_rows": reference["rows"], "live_rows": int(np.asarray(classes).sum())}
+    for f, name in enumerate(FEATURES):
+        value = psi(reference["features"][f], features[f])
+        report["features"].append({
+            "feature": name,
+            "psi": None if value is None else round(value, 4),
+            "status": status(value),
+            "bin_edges": BIN_EDGES[f].tolist(),
+            "reference": shares(reference["features"][f]),
+            "live": shares(features[f]),
+        })
+    value = psi(reference["classes"], classes)
+    report["predictions"] = {
+        "psi": None if value is None else round(value, 4),
+        "status": status(value),
+        "reference": dict(zip(CLASSES, shares(reference["classes"]))),
+        "live": dict(zip(CLASSES, shares(classes))),
+    }
+    scores = [f["psi"] for f in report["features"] if f["psi"] is not None]
+    report["max_feature_psi"] = max(scores) if scores else None
+    report["status"] = status(report["max_feature_psi"])
+    return report
+
+
+class DriftMonitor:
+    """
+    In-memory drift windows for one process. observe() is called inline with
+    batch scoring; maybe_flush() writes and clears the windows once they are
+    FLUSH_SECONDS old.
+    """
+
+    def __init__(self, flush_seconds=FLUSH_SECONDS):
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._reset()
+        self._flushed_at = time.monotonic()
+
+    def _reset(self):
+        self._slots = {}
+        self._features = np.zeros((MAX_SLOTS, len(FEATURES), N_BINS), dtype=np.int64)
+        self._classes = np.zeros((MAX_SLOTS, len(CLASSES)), dtype=np.int64)
+        self._window_start = datetime.now(timezone.utc).replace(tzinfo=None)
+        self.dropped_rows = 0
+
+    def _slot(self, model_version, department):
+        """Window index for a key, or None when the table is full (those rows are counted as dropped)."""
+        key = (model_version, department)
+        if key not in self._slots and len(self._slots) >= MAX_SLOTS - 1:
+            # Keep the last slot for departments beyond the limit
+            key = (model_version, OVERFLOW_DEPARTMENT)
+        if key not in self._slots:
+            if len(self._slots) >= MAX_SLOTS:
+                return None
+            self._slots[key] = len(self._slots)
+        return self._slots[key]
+
+    def observe(self, X, departments, levels, model_version):
+        """Fold one batch of freshly scored rows into the current window."""
+        if len(X) == 0:
+            return
+        names, inverse = np.unique(np.asarray(departments, dtype=str), return_inverse=True)
+        features = feature_histograms(X, inverse, len(names))
+        classes = class_counts(levels, inverse, len(names))
+        with self._lock:
+            for name, f, c in zip(names, features, classes):
+                slot = self._slot(model_version, str(name))
+                if slot is None:
+                    self.dropped_rows += int(c.sum())
+                    continue
+                self._features[slot] += f
+                self._classes[slot] += c
+
+    def window(self, model_version, department=None):
+        """Unflushed (features, classes) counts for a version, optionally one department."""
+        with self._lock:
+            slots = [i for (version, dept), i in self._slots.items()
+                     if version == model_version and (department is None or dept == department)]
+            return self._features[slots].sum(axis=0), self._classes[slots].sum(axis=0)
+
+    def maybe_flush(self, connect=None):
+        connect = connect or _connect
+        if time.monotonic() - self._flushed_at >= self.flush_seconds:
+            self.flush(connect)
+
+    def flush(self, connect):
+        """Write one row per (model version, department) window and start a new window."""
+        with self._lock:
+            slots, features, classes = self._slots, self._features, self._classes
+            window_start = self._window_start
+            self._reset()
+            self._flushed_at = time.monotonic()
+        if not slots:
+            return
+        window_end = datetime.now(timezone.utc).replace(tzinfo=None)
+        rows = [
+            (version, dept, window_start, window_end, int(classes[i].sum()),
+             json.dumps(features[i].tolist()), json.dumps(classes[i].tolist()))
+            for (version, dept), i in slots.items()
+        ]
+        conn = None
+        try:
+            conn = connect()
+            cur = conn.cursor()
+            cur.executemany("""
+                INSERT INTO ai_drift_stats
+                    (model_version, department, window_start, window_end, n_rows, feature_counts, class_counts)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, rows)
+            conn.commit()
+            cur.close()
+        except Exception as e:
+            # Monitoring must never break scoring; keep the counts for the next flush
+            print(f"Error flushing drift statistics: {e}")
+            with self._lock:
+                for (version, dept), i in slots.items():
+                    j = self._slot(version, dept)
+                    if j is None:
+                        continue
+                    self._features[j] += features[i]
+                    self._classes[j] += classes[i]
+                self._window_start = min(self._window_start, window_start)
+        finally:
+            if conn: conn.close()
+
+
+def load_window(conn, model_version, days, department=None):
+    """Sum the flushed (features, classes) counts for a version over the last `days` days."""
+    query = """
+        SELECT feature_counts, class_counts FROM ai_drift_stats
+        WHERE model_version = %s AND window_end >= UTC_TIMESTAMP() - INTERVAL %s DAY
+    """
+    params = [model_version, days]
+    if department:
+        query += " AND department = %s"
+        params.append(department)
+    features = np.zeros((len(FEATURES), N_BINS), dtype=np.int64)
+    classes = np.zeros(len(CLASSES), dtype=np.int64)
+    cur = conn.cursor()
+    cur.execute(query, tuple(params))
+    for feature_counts, counts in cur:
+        features += np.asarray(json.loads(feature_counts), dtype=np.int64)
+        classes += np.asarray(json.loads(counts), dtype=np.int64)
+    cur.close()
+    return features, classes
+
+
+def department_mix(conn, model_version, days):
+    """Predicted level counts per department over the last `days` days, from flushed windows."""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT department, class_counts FROM ai_drift_stats
+        WHERE model_version = %s AND window_end >= UTC_TIMESTAMP() - INTERVAL %s DAY
+    """, (model_version, days))
+    mix = {}
+    for department, counts in cur:
+        mix[department] = mix.get(department, 0) + np.asarray(json.loads(counts), dtype=np.int64)
+    cur.close()
+    return mix
+
+
+monitor = DriftMonitor()
+
+
+def _connect():
+    # Imported lazily: training imports this module and must not open a database pool
+    from db_connect import get_connection
+    return get_connection()
+
+
+def _flush_at_exit():
+    monitor.flush(_connect)
+
+
+atexit.register(_flush_at_exit)
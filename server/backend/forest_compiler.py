@@ -0,0 +1,268 @@
+"""
+forest_compiler.py
+Flattens the trained RandomForest and StandardScaler into a versioned model
+bundle of plain NumPy node arrays, and evaluates it without scikit-learn.
+
+A bundle is a directory holding meta.json plus one uncompressed .npy file per
+array. Arrays are stored in the exact layout the evaluator uses (int64 ids,
+children already offset to global node ids), so load_bundle can open them
+with np.load(mmap_mode="r") and every worker process shares one page-cache
+copy instead of holding a private unpickled forest.
+
+The scaler is folded into the split thresholds (x_scaled <= t  <=>  x <= t*scale + mean),
+so serving compares raw features directly and never runs a transform pass.
+All trees are padded to the same node count, so a batch is traversed for
+every tree at once, one depth level per step. Leaves point at themselves,
+which lets shallow paths idle until the deepest tree finishes. Leaf values
+are normalised and averaged in tree order exactly as sklearn does; only
+inputs within float32 rounding of a split can land on the other side.
+
+Usage: python forest_compiler.py   # bundle models/*.pkl and publish it to the model registry
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+import numpy as np
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+BUNDLE_FORMAT = "edupredict-risk-forest/2"
+META_NAME = "meta.json"
+
+# Arrays stored in a bundle, in checksum order
+ARRAY_KEYS = ("feature", "threshold", "children_left", "children_right", "leaf_proba")
+
+
+def compile_forest(model, scaler):
+    """
+    Export a fitted RandomForestClassifier (or a single DecisionTreeClassifier,
+    treated as a one-tree forest) + StandardScaler to scaler-folded node arrays.
+    """
+    trees = [est.tree_ for est in getattr(model, "estimators_", [model])]
+    n_trees = len(trees)
+    n_nodes = max(t.node_count for t in trees)
+    n_classes = len(model.classes_)
+    mean = np.asarray(scaler.mean_, dtype=np.float64)
+    scale = np.asarray(scaler.scale_, dtype=np.float64)
+
+    feature = np.zeros((n_trees, n_nodes), dtype=np.int64)
+    threshold = np.zeros((n_trees, n_nodes), dtype=np.float64)
+    # Global node ids (tree * n_nodes + local id); leaves point at themselves
+    offsets = (np.arange(n_trees, dtype=np.int64) * n_nodes)[:, np.newaxis]
+    left = np.tile(np.arange(n_nodes, dtype=np.int64), (n_trees, 1)) + offsets
+    right = left.copy()
+    leaf_proba = np.zeros((n_trees, n_nodes, n_classes), dtype=np.float64)
+
+    for i, t in enumerate(trees):
+        count = t.node_count
+        internal = t.children_left[:count] != -1
+        idx = np.nonzero(internal)[0]
+        feats = t.feature[idx]
+        feature[i, idx] = feats
+        # Fold StandardScaler into the split: scale is always > 0, so the direction holds
+        threshold[i, idx] = t.threshold[idx] * scale[feats] + mean[feats]
+        left[i, idx] = t.children_left[idx] + i * n_nodes
+        right[i, idx] = t.children_right[idx] + i * n_nodes
+
+        # Same normalisation DecisionTreeClassifier.predict_proba applies to each leaf
+        proba = t.value[:count, 0, :n_classes].copy()
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        proba /= normalizer
+        leaf_proba[i, :count] = proba
+
+    return {
+        "feature": feature,
+        "threshold": threshold,
+        "children_left": left,
+        "children_right": right,
+        "leaf_proba": leaf_proba,
+    }
+
+
+def checksum(arrays):
+    """SHA-256 over the bundle arrays (dtype, shape and bytes) in a fixed order."""
+    digest = hashlib.sha256()
+    for key in ARRAY_KEYS:
+        arr = np.ascontiguousarray(arrays[key])
+        digest.update(f"{key}:{arr.dtype.str}:{arr.shape}".encode("utf-8"))
+        # Hash the buffer in place; tobytes() would copy a memory-mapped bundle into private memory
+        digest.update(memoryview(arr).cast("B"))
+    return digest.hexdigest()
+
+
+def build_meta(arrays, classes, feature_names, training=None):
+    """Bundle metadata; training records how the model was produced (mode, rows, data watermark)."""
+    return {
+        "format": BUNDLE_FORMAT,
+        "classes": [str(c) for c in classes],
+        "feature_names": list(feature_names),
+        "n_trees": int(arrays["feature"].shape[0]),
+        "max_depth": _max_depth(arrays),
+        "checksum": checksum(arrays),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "training": training,
+    }
+
+
+def _max_depth(arrays):
+    """Longest root-to-leaf path over all trees."""
+    left = np.asarray(arrays["children_left"])
+    right = np.asarray(arrays["children_right"])
+    n_trees, n_nodes = left.shape
+    left, right = left.ravel(), right.ravel()
+    frontier = np.arange(n_trees, dtype=np.int64) * n_nodes
+    depth = 0
+    while True:
+        children = np.concatenate([left[frontier], right[frontier]])
+        frontier = children[children != np.concatenate([frontier, frontier])]
+        if frontier.size == 0:
+            return depth
+        depth += 1
+
+
+class CompiledForest:
+    """Pure-NumPy evaluator for a model bundle; takes raw (unscaled) features."""
+
+    def __init__(self, arrays, meta):
+        self.meta = meta
+        self.version = meta["checksum"][:12]
+        self.classes_ = np.asarray(meta["classes"])
+        self.feature_names = meta["feature_names"]
+        self.max_depth = int(meta["max_depth"])
+
+        # Flat views over the (possibly memory-mapped) arrays, so traversal is a
+        # handful of 1-D np.take calls and nothing is copied per worker
+        n_trees, n_nodes = arrays["feature"].shape
+        self._roots = (np.arange(n_trees, dtype=np.int64) * n_nodes)[:, np.newaxis]
+        self._feature = arrays["feature"].reshape(-1)
+        self._threshold = arrays["threshold"].reshape(-1)
+        self._left = arrays["children_left"].reshape(-1)
+        self._right = arrays["children_right"].reshape(-1)
+        self._leaf_proba = arrays["leaf_proba"].reshape(n_trees * n_nodes, -1)
+
+    def apply(self, X):
+        """Global leaf id reached by every sample in every tree, shape (n_trees, n_samples)."""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        n_samples, n_features = X.shape
+        flat_X = X.ravel()
+        row_base = np.arange(n_samples, dtype=np.int64) * n_features
+        node = np.repeat(self._roots, n_samples, axis=1)
+        for _ in range(self.max_depth):
+            values = flat_X.take(row_base + self._feature.take(node))
+            go_left = values <= self._threshold.take(node)
+            node = np.where(go_left, self._left.take(node), self._right.take(node))
+        return node
+
+    def predict_proba(self, X):
+        """Class probabilities for raw features."""
+        X = np.atleast_2d(X)
+        leaves = self.apply(X)
+        proba = np.zeros((X.shape[0], len(self.classes_)), dtype=np.float64)
+        # Accumulate tree by tree, in order, exactly as sklearn does
+        for t in range(leaves.shape[0]):
+            proba += self._leaf_proba.take(leaves[t], axis=0)
+        proba /= leaves.shape[0]
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def contributions(self, X):
+        """
+        Tree-path (Saabas) attribution of predict_proba for raw features.
+
+        Every split a sample passes moves its class distribution from the
+        parent node's value to the child's; that change is credited to the
+        split feature and averaged over trees. Returns (bias, contrib) with
+        bias of shape (n_classes,) and contrib of shape
+        (n_samples, n_features, n_classes), where
+        bias + contrib.sum(axis=1) == predict_proba(X).
+        """
+        X = np.ascontiguousarray(np.atleast_2d(X), dtype=np.float64)
+        n_samples, n_features = X.shape
+        n_classes = len(self.classes_)
+        n_trees = self._roots.shape[0]
+        flat_X = X.ravel()
+        # Offset of each sample's block in the flattened (sample, feature) output
+        row_base = np.arange(n_samples, dtype=np.int64) * n_features
+        contrib = np.zeros((n_samples * n_features, n_classes), dtype=np.float64)
+
+        node = np.repeat(self._roots, n_samples, axis=1)
+        for _ in range(self.max_depth):
+            slot = row_base + self._feature.take(node)
+            go_left = flat_X.take(slot) <= self._threshold.take(node)
+            child = np.where(go_left, self._left.take(node), self._right.take(node))
+            # Node values cover internal nodes too; leaves self-loop, so their delta is zero
+            delta = self._leaf_proba.take(child, axis=0) - self._leaf_proba.take(node, axis=0)
+            slot = slot.ravel()
+            for c in range(n_classes):
+                contrib[:, c] += np.bincount(slot, weights=delta[..., c].ravel(), minlength=contrib.shape[0])
+            node = child
+
+        bias = self._leaf_proba.take(self._roots[:, 0], axis=0).mean(axis=0)
+        return bias, contrib.reshape(n_samples, n_features, n_classes) / n_trees
+
+
+def save_bundle(path, arrays, classes, feature_names, training=None):
+    """Write a bundle directory: meta.json (format, class order, features, checksum) + one .npy per array."""
+    meta = build_meta(arrays, classes, feature_names, training)
+    os.makedirs(path, exist_ok=True)
+    for key in ARRAY_KEYS:
+        np.save(os.path.join(path, f"{key}.npy"), np.ascontiguousarray(arrays[key]), allow_pickle=False)
+    # meta.json last: its presence marks the bundle complete
+    with open(os.path.join(path, META_NAME), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def read_meta(path):
+    with open(os.path.join(path, META_NAME), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_bundle(path, mmap_mode="r"):
+    """
+    Open and validate a bundle; raises ValueError on format or checksum mismatch.
+    With mmap_mode="r" the arrays stay file-backed and shared between processes.
+    """
+    meta = read_meta(path)
+    if meta.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported model bundle format: {meta.get('format')}")
+    arrays = {
+        key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+        for key in ARRAY_KEYS
+    }
+    if checksum(arrays) != meta["checksum"]:
+        raise ValueError("Model bundle checksum mismatch")
+    return CompiledForest(arrays, meta)
+
+
+def verify(model, scaler, compiled, num_samples=5000, seed=0):
+    """Fraction of random feature rows where the bundle reproduces sklearn's probabilities."""
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.uniform(0, 100, num_samples),
+        rng.uniform(0, 25, num_samples),
+        rng.uniform(0, 10, num_samples),
+        rng.uniform(0, 10, num_samples),
+        rng.integers(0, 8, num_samples),
+    ]).astype(np.float64)
+    expected = model.predict_proba(scaler.transform(X))
+    actual = compiled.predict_proba(X)
+    return float(np.mean(np.all(np.isclose(expected, actual, rtol=0, atol=1e-12), axis=1)))
+
+
+if __name__ == "__main__":
+    import joblib
+    import model_registry
+    from risk_engine import FEATURES
+    model = joblib.load(os.path.join(MODELS_DIR, "risk_model.pkl"))
+    scaler = joblib.load(os.path.join(MODELS_DIR, "scaler.pkl"))
+    arrays = compile_forest(model, scaler)
+    version = model_registry.publish(arrays, model.classes_, FEATURES)
+    bundle = load_bundle(model_registry.bundle_path(version))
+    print(f"Published {bundle.meta['n_trees']} trees ({arrays['feature'].shape[1]} nodes max, "
+          f"depth {bundle.max_depth}) as version {version}")
+    print(f"Agreement with sklearn predict_proba: {verify(model, scaler, bundle):.2%}")
@@ -0,0 +1,141 @@
+"""
+model_compression.py
+Post-training compression of the risk forest for serving.
+
+Candidates are built three ways from the trained ("teacher") forest:
+    - pruning: keep only the first k trees (they are independent bootstrap fits)
+    - distilled tree: one depth-limited DecisionTree fit to the teacher's labels
+    - distilled forest: a small, shallow forest fit to the teacher's labels
+Distillation data is the training split plus uniform samples over the feature
+ranges, all labelled by the teacher, so students also learn the boundary in
+regions the real data rarely covers.
+
+Every candidate is compiled the way production serves it and checked against
+the teacher on held-out rows; the fastest one whose risk-level agreement
+meets the threshold, and whose 0-100 risk scores stay within
+DEFAULT_MAX_SCORE_MAE points on average, wins. If none does, the teacher is kept.
+"""
+
+import os
+import copy
+import time
+import tempfile
+import numpy as np
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.ensemble import RandomForestClassifier
+from forest_compiler import compile_forest, save_bundle, load_bundle, build_meta, CompiledForest
+from risk_engine import FEATURES, score_batch
+
+DEFAULT_MIN_AGREEMENT = 0.99
+# Distilled models learn hard labels, so their scores can drift even when levels agree
+DEFAULT_MAX_SCORE_MAE = 5.0
+PRUNED_TREE_COUNTS = (5, 10, 20, 35, 50)
+DISTILLED_TREE_DEPTHS = (4, 6, 8, 10)
+DISTILLED_FORESTS = ((10, 6), (10, 8), (25, 8))  # (trees, depth)
+DISTILL_SYNTHETIC_ROWS = 20000
+THROUGHPUT_BATCH = 10000
+
+
+def _feature_box_samples(X, n, seed):
+    """Uniform rows spanning the observed range of each feature (backlogs stay integral)."""
+    rng = np.random.default_rng(seed)
+    low, high = X.min(axis=0), X.max(axis=0)
+    samples = rng.uniform(low, high, size=(n, X.shape[1]))
+    samples[:, 4] = np.round(samples[:, 4])
+    return samples
+
+
+def _pruned(model, k):
+    small = copy.copy(model)
+    small.estimators_ = model.estimators_[:k]
+    small.n_estimators = k
+    return small
+
+
+def _compiled(model, scaler):
+    arrays = compile_forest(model, scaler)
+    return CompiledForest(arrays, build_meta(arrays, model.classes_, FEATURES))
+
+
+def _throughput(compiled, X):
+    batch = X[np.arange(THROUGHPUT_BATCH) % len(X)]
+    start = time.perf_counter()
+    compiled.predict_proba(batch)
+    return THROUGHPUT_BATCH / (time.perf_counter() - start)
+
+
+def serving_profile(model, scaler, X):
+    """Bundle size on disk, bundle load time and compiled batch throughput for one model."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bundle")
+        arrays = compile_forest(model, scaler)
+        save_bundle(path, arrays, model.classes_, FEATURES)
+        size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        start = time.perf_counter()
+        compiled = load_bundle(path, mmap_mode=None)
+        load_ms = (time.perf_counter() - start) * 1000
+        return {
+            "trees": len(getattr(model, "estimators_", [model])),
+            "nodes": int(sum(t.tree_.node_count for t in getattr(model, "estimators_", [model]))),
+            "size_bytes": size,
+            "load_ms": load_ms,
+            "rows_per_second": _throughput(compiled, X),
+        }
+
+
+def compress(model, scaler, X_train, X_eval, min_agreement=DEFAULT_MIN_AGREEMENT,
+             max_score_mae=DEFAULT_MAX_SCORE_MAE, seed=42):
+    """
+    Return (chosen_model, name, candidates). Agreement is measured on X_eval
+    (raw features) as the share of rows whose risk level matches the teacher.
+    """
+    teacher = _compiled(model, scaler)
+    teacher_levels, teacher_scores = score_batch(teacher, None, X_eval)
+
+    X_distill = np.vstack([X_train, _feature_box_samples(X_train, DISTILL_SYNTHETIC_ROWS, seed)])
+    y_distill = teacher.predict(X_distill)
+    X_distill_scaled = scaler.transform(X_distill)
+
+    built = []
+    n_trees = len(model.estimators_)
+    for k in PRUNED_TREE_COUNTS:
+        if k < n_trees:
+            built.append((f"first {k} trees", _pruned(model, k)))
+    for depth in DISTILLED_TREE_DEPTHS:
+        tree = DecisionTreeClassifier(max_depth=depth, random_state=seed)
+        built.append((f"distilled tree, depth {depth}", tree.fit(X_distill_scaled, y_distill)))
+    for trees, depth in DISTILLED_FORESTS:
+        forest = RandomForestClassifier(n_estimators=trees, max_depth=depth, random_state=seed, n_jobs=-1)
+        built.append((f"distilled forest, {trees} trees depth {depth}", forest.fit(X_distill_scaled, y_distill)))
+
+    candidates = []
+    for name, candidate in built:
+        compiled = _compiled(candidate, scaler)
+        levels, scores = score_batch(compiled, None, X_eval)
+        candidates.append({
+            "name": name,
+            "model": candidate,
+            "agreement": float(np.mean(levels == teacher_levels)),
+            "score_mae": float(np.mean(np.abs(scores - teacher_scores))),
+            "rows_per_second": _throughput(compiled, X_eval),
+        })
+
+    passing = [c for c in candidates if c["agreement"] >= min_agreement and c["score_mae"] <= max_score_mae]
+    if not passing:
+        return model, "original forest", candidates
+    best = max(passing, key=lambda c: c["rows_per_second"])
+    return best["model"], best["name"], candidates
+
+
+def print_report(candidates, before, after, chosen_name, min_agreement):
+    print(f"\nCompression candidates (agreement threshold {min_agreement:.2%}):")
+    print(f"{'candidate':>34} {'agreement':>10} {'score MAE':>10} {'rows/s':>10}")
+    for c in sorted(candidates, key=lambda c: -c["rows_per_second"]):
+        mark = "*" if c["name"] == chosen_name else " "
+        print(f"{mark}{c['name']:>33} {c['agreement']:>10.2%} {c['score_mae']:>10.2f} {c['rows_per_second']:>10.0f}")
+
+    print(f"\nServing profile ({chosen_name}):")
+    print(f"{'':>12} {'trees':>6} {'nodes':>8} {'size (KB)':>10} {'load (ms)':>10} {'rows/s':>10}")
+    for label, p in (("before", before), ("after", after)):
+        print(f"{label:>12} {p['trees']:>6} {p['nodes']:>8} {p['size_bytes'] / 1024:>10.1f} "
+              f"{p['load_ms']:>10.2f} {p['rows_per_second']:>10.0f}")
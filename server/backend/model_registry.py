@@ -0,0 +1,191 @@
+"""
+model_registry.py
+On-disk registry of versioned risk model bundles.
+
+Layout:
+    models/registry/<version>/meta.json, *.npy   one bundle per version (see forest_compiler)
+    models/registry/CURRENT                       name of the version being served
+
+Every write goes to a temp file or directory next to its target followed by
+os.replace, so readers only ever see a complete bundle or pointer. The serving
+side uses ModelWatcher, which notices pointer changes and swaps the loaded
+model between requests without a process restart. Bundles are memory-mapped
+read-only, so all workers on a host share one copy of the node arrays.
+
+Usage:
+    python model_registry.py                 # list versions
+    python model_registry.py use <version>   # roll forward/back
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+from forest_compiler import save_bundle, load_bundle, read_meta, checksum, META_NAME
+
+REGISTRY_DIR = os.path.join(os.path.dirname(__file__), "models", "registry")
+CURRENT_PATH = os.path.join(REGISTRY_DIR, "CURRENT")
+# "r" shares pages between workers; set AI_MODEL_MMAP=none to load into private memory
+MMAP_MODE = os.environ.get("AI_MODEL_MMAP", "r").lower()
+MMAP_MODE = None if MMAP_MODE == "none" else MMAP_MODE
+
+
+def bundle_path(version):
+    return os.path.join(REGISTRY_DIR, version)
+
+
+def _exists(version):
+    return os.path.exists(os.path.join(bundle_path(version), META_NAME))
+
+
+def _atomic_write(path, write_fn):
+    """Write via write_fn(tmp_path) then atomically move into place."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    os.close(fd)
+    try:
+        write_fn(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def publish(arrays, classes, feature_names, activate=True, training=None):
+    """Store a bundle under its checksum-derived version; optionally make it current."""
+    version = checksum(arrays)[:12]
+    if not _exists(version):
+        os.makedirs(REGISTRY_DIR, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=REGISTRY_DIR, prefix=".tmp-")
+        try:
+            os.chmod(tmp_dir, 0o755)  # mkdtemp is owner-only; workers may run as another user
+            save_bundle(tmp_dir, arrays, classes, feature_names, training)
+            # Files are never rewritten in place, so mapped readers of other versions are safe
+            os.replace(tmp_dir, bundle_path(version))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            # Losing a race to a concurrent publish of the same version is fine
+            if not _exists(version):
+                raise
+    if activate:
+        set_current(version)
+    return version
+
+
+def set_current(version):
+    """Atomically repoint CURRENT at an existing version."""
+    if not _exists(version):
+        raise ValueError(f"Unknown model version: {version}")
+
+    def write(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(version + "\n")
+    _atomic_write(CURRENT_PATH, write)
+
+
+def current_version():
+    try:
+        with open(CURRENT_PATH, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_meta():
+    """Bundle metadata of the version being served, or None if the registry is empty."""
+    version = current_version()
+    return read_meta(bundle_path(version)) if version and _exists(version) else None
+
+
+def list_versions():
+    """All stored versions, newest first, with their bundle metadata."""
+    if not os.path.isdir(REGISTRY_DIR):
+        return []
+    current = current_version()
+    versions = []
+    for name in os.listdir(REGISTRY_DIR):
+        if name.startswith(".") or not _exists(name):
+            continue
+        meta = read_meta(bundle_path(name))
+        versions.append({
+            "version": name,
+            "created_at": meta.get("created_at"),
+            "n_trees": meta.get("n_trees"),
+            "max_depth": meta.get("max_depth"),
+            "training": meta.get("training"),
+            "is_current": name == current,
+        })
+    versions.sort(key=lambda v: v["created_at"] or "", reverse=True)
+    return versions
+
+
+class ModelWatcher:
+    """
+    Serves the current registry model and hot-swaps it when CURRENT changes.
+
+    get() stats the pointer at most once per poll interval. A changed pointer
+    is loaded by one thread without holding the lock, so other callers keep
+    getting the previous model meanwhile; the new one is published with a
+    single reference swap under the lock, and in-flight scoring keeps the
+    model it started with.
+    """
+
+    def __init__(self, poll_seconds=2.0):
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._loading = threading.Lock()
+        self._model = None
+        self._pointer_mtime = None
+        self._checked_at = 0.0
+
+    def get(self):
+        """Return the current CompiledForest, or None if the registry is empty."""
+        now = time.monotonic()
+        if now - self._checked_at >= self.poll_seconds:
+            self._checked_at = now
+            self._refresh()
+        return self._model
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(CURRENT_PATH).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._pointer_mtime:
+            return
+        # Another thread is already loading: keep serving the current model
+        if not self._loading.acquire(blocking=False):
+            return
+        try:
+            version = current_version()
+            try:
+                model = load_bundle(bundle_path(version), mmap_mode=MMAP_MODE)
+            except Exception as e:
+                # Keep serving the previous model; retry on the next poll
+                print(f"Error loading model version {version}: {e}")
+                return
+            with self._lock:
+                try:
+                    moved = os.stat(CURRENT_PATH).st_mtime_ns != mtime
+                except FileNotFoundError:
+                    moved = True
+                if moved or mtime == self._pointer_mtime:
+                    # CURRENT changed again while loading; the next poll loads the newer one
+                    return
+                self._model = model
+                self._pointer_mtime = mtime
+            print(f"AI model version {version} is now live.")
+        finally:
+            self._loading.release()
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "use":
+        set_current(sys.argv[2])
+        print(f"CURRENT -> {sys.argv[2]}")
+    else:
+        print(json.dumps(list_versions(), indent=2))
@@ -0,0 +1,145 @@
+"""
+model_search.py
+Cross-validated hyperparameter search for the risk forest.
+
+Every (candidate, fold) pair is an independent task on a process pool sized to
+the machine, with n_jobs=1 inside each fit so cores are not oversubscribed.
+Besides accuracy, each task times the fit and the serving latency of the
+fold's model compiled the way production runs it (forest_compiler), so the
+chosen model is scored on what it will actually cost to serve.
+
+Selection: among candidates whose median latency fits the budget, take the
+most accurate; anything within ACCURACY_TOLERANCE of it counts as a tie and
+the cheapest of those wins.
+"""
+
+import os
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sklearn.model_selection import StratifiedKFold
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import accuracy_score, f1_score
+from forest_compiler import compile_forest, build_meta, CompiledForest
+from risk_engine import FEATURES
+
+DEFAULT_GRID = {
+    "n_estimators": [50, 100, 200],
+    "max_depth": [6, 8, 10, None],
+    "min_samples_leaf": [1, 5, 20],
+    "class_weight": [None, "balanced"],
+}
+# Latency is measured on a batch this size, about one department's worth of students
+LATENCY_BATCH = 1000
+LATENCY_REPEATS = 5
+ACCURACY_TOLERANCE = 0.002
+
+# Training data handed to each worker once, instead of once per task
+_X = None
+_y = None
+
+
+def candidates(grid=None):
+    grid = grid or DEFAULT_GRID
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def _init_worker(X, y):
+    global _X, _y
+    _X, _y = X, y
+
+
+def _serving_latency_ms(model, scaler, X):
+    """Median wall time to score a LATENCY_BATCH-row batch with the compiled forest."""
+    arrays = compile_forest(model, scaler)
+    compiled = CompiledForest(arrays, build_meta(arrays, model.classes_, FEATURES))
+    batch = X[np.arange(LATENCY_BATCH) % len(X)]
+    timings = []
+    for _ in range(LATENCY_REPEATS):
+        start = time.perf_counter()
+        compiled.predict_proba(batch)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def _run_fold(params, train_idx, test_idx, seed):
+    X_train, X_test = _X[train_idx], _X[test_idx]
+    y_train, y_test = _y[train_idx], _y[test_idx]
+
+    start = time.perf_counter()
+    scaler = StandardScaler().fit(X_train)
+    model = RandomForestClassifier(random_state=seed, n_jobs=1, **params)
+    model.fit(scaler.transform(X_train), y_train)
+    fit_seconds = time.perf_counter() - start
+
+    y_pred = model.predict(scaler.transform(X_test))
+    return {
+        "accuracy": float(accuracy_score(y_test, y_pred)),
+        "macro_f1": float(f1_score(y_test, y_pred, average="macro")),
+        "fit_seconds": fit_seconds,
+        "latency_ms": _serving_latency_ms(model, scaler, X_test),
+        "n_nodes": int(sum(est.tree_.node_count for est in model.estimators_)),
+    }
+
+
+def search(X, y, grid=None, folds=5, workers=None, latency_budget_ms=None, seed=42):
+    """
+    Evaluate every grid candidate with stratified k-fold CV.
+    Returns (best_params, results) where results holds one summary dict per
+    candidate, best first.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    params_list = candidates(grid)
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(X, y))
+    workers = workers or os.cpu_count() or 1
+
+    print(f"Searching {len(params_list)} candidates x {folds} folds on {workers} processes...")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, y)) as pool:
+        futures = {
+            (c, f): pool.submit(_run_fold, params, train_idx, test_idx, seed)
+            for c, params in enumerate(params_list)
+            for f, (train_idx, test_idx) in enumerate(splits)
+        }
+        fold_results = {key: future.result() for key, future in futures.items()}
+    print(f"Search finished in {time.perf_counter() - start:.1f}s")
+
+    results = []
+    for c, params in enumerate(params_list):
+        runs = [fold_results[(c, f)] for f in range(folds)]
+        results.append({
+            "params": params,
+            "accuracy": float(np.mean([r["accuracy"] for r in runs])),
+            "accuracy_std": float(np.std([r["accuracy"] for r in runs])),
+            "macro_f1": float(np.mean([r["macro_f1"] for r in runs])),
+            "fit_seconds": float(np.sum([r["fit_seconds"] for r in runs])),
+            "latency_ms": float(np.median([r["latency_ms"] for r in runs])),
+            "n_nodes": int(np.mean([r["n_nodes"] for r in runs])),
+        })
+
+    best = select(results, latency_budget_ms)
+    results.sort(key=lambda r: (r is not best, -r["accuracy"], r["latency_ms"]))
+    return best["params"], results
+
+
+def select(results, latency_budget_ms=None):
+    """Most accurate candidate within the latency budget, preferring the cheaper one on near-ties."""
+    eligible = [r for r in results if latency_budget_ms is None or r["latency_ms"] <= latency_budget_ms]
+    if not eligible:
+        # Nothing fits: serve the fastest model rather than fail the training run
+        print(f"No candidate meets the {latency_budget_ms} ms budget; choosing the fastest.")
+        return min(results, key=lambda r: r["latency_ms"])
+    top = max(r["accuracy"] for r in eligible)
+    near_best = [r for r in eligible if r["accuracy"] >= top - ACCURACY_TOLERANCE]
+    return min(near_best, key=lambda r: r["latency_ms"])
+
+
+def print_results(results, limit=10):
+    print(f"\n{'accuracy':>9} {'+/-':>6} {'macro F1':>9} {'fit (s)':>8} {'latency (ms)':>13} {'nodes':>7}  params")
+    for r in results[:limit]:
+        print(f"{r['accuracy']:>9.4f} {r['accuracy_std']:>6.3f} {r['macro_f1']:>9.4f} {r['fit_seconds']:>8.2f} "
+              f"{r['latency_ms']:>13.2f} {r['n_nodes']:>7}  {r['params']}")
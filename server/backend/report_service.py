@@ -9,6 +9,7 @@ from io import BytesIO
 from datetime import datetime
 from io import BytesIO
 from db_connect import get_connection
+from utils import get_faculty_department
 
 report_bp = Blueprint('report', __name__)
 
@@ -29,17 +30,15 @@ def generate_risk_report():
         # Determine department filter for faculty
         dept_filter = None
         if role == "FACULTY":
-            cur.execute("SELECT department FROM faculties WHERE email = (SELECT email FROM users WHERE id = %s)", (user_id,))
-            f_row = cur.fetchone()
-            dept_filter = f_row['department'] if f_row and f_row['department'] else None
+            dept_filter = get_faculty_department(conn)
         
         # Fetch high-risk students with calculated attendance
         query = """
             SELECT 
                 s.student_id, s.name, s.department, s.risk_score, s.backlogs,
-                COALESCE(AVG(sar.attendance_percentage), 0) as attendance_percentage
+                COALESCE(f.avg_attendance, 0) as attendance_percentage
             FROM students s
-            LEFT JOIN student_academic_records sar ON s.student_id = sar.student_id
+            LEFT JOIN student_features f ON f.student_id = s.student_id
             WHERE s.risk_level = 'High'
         """
         
@@ -49,7 +48,6 @@ def generate_risk_report():
             params.append(dept_filter)
             
         query += """
-            GROUP BY s.student_id, s.name, s.department, s.risk_score, s.backlogs
             ORDER BY s.risk_score DESC
         """
         
@@ -165,17 +163,15 @@ def generate_performance_report():
         # Determine department filter for faculty
         dept_filter = None
         if role == "FACULTY":
-            cur.execute("SELECT department FROM faculties WHERE email = (SELECT email FROM users WHERE id = %s)", (user_id,))
-            f_row = cur.fetchone()
-            dept_filter = f_row['department'] if f_row and f_row['department'] else None
+            dept_filter = get_faculty_department(conn)
             
         # Fetch all students with calculated attendance
         query = """
             SELECT 
                 s.student_id, s.name, s.department, s.semester, s.sgpa, s.risk_level,
-                COALESCE(AVG(sar.attendance_percentage), 0) as attendance_percentage
+                COALESCE(f.avg_attendance, 0) as attendance_percentage
             FROM students s
-            LEFT JOIN student_academic_records sar ON s.student_id = sar.student_id
+            LEFT JOIN student_features f ON f.student_id = s.student_id
         """
         
         params = []
@@ -184,7 +180,6 @@ def generate_performance_report():
             params.append(dept_filter)
             
         query += """
-            GROUP BY s.student_id, s.name, s.department, s.semester, s.sgpa, s.risk_level
             ORDER BY s.sgpa DESC
         """
         
@@ -0,0 +1,159 @@
+"""
+result_cache.py
+Caches finished risk analysis payloads keyed by (scope, model version, data version).
+
+The data version is a counter in `app_data_versions` that every write to
+`students` or `student_academic_records` bumps in its own transaction, and
+each scoring run records the data version and model version it read. A
+payload whose versions match the current ones is exact, so /api/ai/predict
+can serve it from memory and skip queueing a refresh; any write or model swap
+changes the key and the old entries simply stop being asked for.
+
+Two layers:
+    - in-process LRU with a TTL (AI_RESULT_CACHE_SIZE entries, AI_RESULT_CACHE_TTL seconds)
+    - optional SQLite file shared by every worker on the host (AI_RESULT_CACHE_PATH)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+DATA_VERSION_NAME = "academic"
+CACHE_SIZE = int(os.environ.get("AI_RESULT_CACHE_SIZE", 256))
+CACHE_TTL = int(os.environ.get("AI_RESULT_CACHE_TTL", 600))
+SHARED_CACHE_PATH = os.environ.get("AI_RESULT_CACHE_PATH")
+
+
+def bump_data_version(cur):
+    """Invalidate cached analyses; call on the writing cursor before commit."""
+    cur.execute("""
+        INSERT INTO app_data_versions (name, version) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """, (DATA_VERSION_NAME,))
+
+
+def data_version(cur):
+    cur.execute("SELECT version FROM app_data_versions WHERE name = %s", (DATA_VERSION_NAME,))
+    row = cur.fetchone()
+    if row is None:
+        return 0
+    return int(row['version'] if isinstance(row, dict) else row[0])
+
+
+def cache_key(scope, model_version, data_ver):
+    return f"{scope}|{model_version}|{data_ver}"
+
+
+class TTLCache:
+    """Thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache:
+    """JSON values in a local SQLite file, so workers on one host share results."""
+
+    def __init__(self, path, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        # One short-lived connection per call: sqlite3 connections are not shared across threads
+        return sqlite3.connect(self.path, timeout=1.0)
+
+    def get(self, key):
+        db = self._connect()
+        try:
+            row = db.execute("SELECT value FROM results WHERE key = ? AND expires >= ?",
+                             (key, time.time())).fetchone()
+        finally:
+            db.close()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value):
+        db = self._connect()
+        try:
+            with db:
+                db.execute("INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)",
+                           (key, json.dumps(value, default=str), time.time() + self.ttl))
+                db.execute("DELETE FROM results WHERE expires < ?", (time.time(),))
+                db.execute("""
+                    DELETE FROM results WHERE key NOT IN (
+                        SELECT key FROM results ORDER BY expires DESC LIMIT ?
+                    )
+                """, (self.maxsize,))
+        finally:
+            db.close()
+
+
+class ResultCache:
+    """In-process LRU in front of the optional shared SQLite cache."""
+
+    def __init__(self, shared_path=SHARED_CACHE_PATH):
+        self.local = TTLCache()
+        self.shared = None
+        if shared_path:
+            try:
+                self.shared = SQLiteCache(shared_path)
+            except sqlite3.Error as e:
+                print(f"Shared result cache disabled ({shared_path}): {e}")
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except sqlite3.Error as e:
+                print(f"Shared result cache read failed: {e}")
+            if value is not None:
+                self.local.put(key, value)
+        return value
+
+    def put(self, key, value):
+        self.local.put(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.put(key, value)
+            except sqlite3.Error as e:
+                print(f"Shared result cache write failed: {e}")
+
+
+cache = ResultCache()
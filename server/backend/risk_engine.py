@@ -0,0 +1,206 @@
+"""
+risk_engine.py
+Batch scoring engine for the AI risk analysis.
+
+Builds one feature matrix for a whole result set and runs the scaler and the
+classifier once, instead of issuing a separate sklearn call per student.
+"""
+
+import hashlib
+import numpy as np
+
+# Column order the model was trained on (see train_model.py)
+FEATURES = ['attendance_percentage', 'internal_marks', 'assignment_score', 'sgpa', 'backlogs']
+
+# Weights used to turn class probabilities into the 0-100 UI risk score
+HIGH_WEIGHT = 100
+MEDIUM_WEIGHT = 40
+
+
+def build_feature_matrix(students):
+    """Assemble an (n, 5) float matrix from rows returned by the predict query."""
+    X = np.zeros((len(students), len(FEATURES)), dtype=np.float64)
+    for i, s in enumerate(students):
+        X[i, 0] = float(s['avg_att'] or 0)
+        X[i, 1] = float(s['avg_marks'] or 0)
+        X[i, 2] = float(s['avg_assignment'] or 0)
+        X[i, 3] = float(s['sgpa'] or 0)
+        X[i, 4] = int(s['backlogs'] or 0)
+    return X
+
+
+def score_batch(model, scaler, X):
+    """
+    Score every row of X with a single scaler/model pass.
+    Pass scaler=None for models that take raw features (see forest_compiler).
+    Returns (risk_levels, risk_scores) as NumPy arrays aligned with X.
+    """
+    if len(X) == 0:
+        return np.empty(0, dtype=object), np.empty(0, dtype=np.float64)
+
+    X_scaled = scaler.transform(X) if scaler is not None else X
+    probabilities = model.predict_proba(X_scaled)
+    classes = model.classes_
+
+    # Same decision rule as model.predict, without a second pass over the trees
+    risk_levels = classes[np.argmax(probabilities, axis=1)].astype(str)
+
+    class_list = classes.tolist()
+    zeros = np.zeros(len(X))
+    p_high = probabilities[:, class_list.index('High')] if 'High' in class_list else zeros
+    p_med = probabilities[:, class_list.index('Medium')] if 'Medium' in class_list else zeros
+    risk_scores = np.round(p_high * HIGH_WEIGHT + p_med * MEDIUM_WEIGHT, 1)
+
+    return risk_levels, risk_scores
+
+
+def simulate_batch(X):
+    """Rule-based fallback used when no trained model is available."""
+    att, marks, backlogs = X[:, 0], X[:, 1], X[:, 4]
+
+    high = (att < 75) | (marks < 14) | (backlogs > 1)
+    medium = ~high & (att < 85)
+
+    risk_levels = np.where(high, 'High', np.where(medium, 'Medium', 'Low'))
+    risk_scores = np.where(high, 85.0, np.where(medium, 45.0, 12.0))
+    return risk_levels, risk_scores
+
+
+def score_rows_individually(model, scaler, X):
+    """
+    Legacy per-student scoring path (one sklearn call per row).
+    Kept for benchmarking against score_batch.
+    """
+    classes = model.classes_.tolist()
+    risk_levels, risk_scores = [], []
+    for row in X:
+        features_scaled = scaler.transform(row.reshape(1, -1))
+        prediction = model.predict(features_scaled)[0]
+        probabilities = model.predict_proba(features_scaled)[0]
+        p_high = float(probabilities[classes.index('High')]) if 'High' in classes else 0.0
+        p_med = float(probabilities[classes.index('Medium')]) if 'Medium' in classes else 0.0
+        risk_levels.append(str(prediction))
+        risk_scores.append(float(round((p_high * HIGH_WEIGHT) + (p_med * MEDIUM_WEIGHT), 1)))
+    return np.array(risk_levels), np.array(risk_scores)
+
+
+# --- Explanations ---
+
+# Rule-based reasons, one column of reason_flags() each
+REASONS = ('attendance', 'internal_marks', 'backlogs', 'sgpa')
+
+
+def reason_flags(X):
+    """Boolean (n, len(REASONS)) matrix: which rule-based reasons apply to each row."""
+    att, marks, sgpa, backlogs = X[:, 0], X[:, 1], X[:, 3], X[:, 4]
+    return np.column_stack([att < 75, marks < 15, backlogs > 1, sgpa < 6.5])
+
+
+def render_reasons(x, flags, sgpa_display):
+    """Reason strings for one row of X; only called for rows that are returned."""
+    reasons = []
+    if flags[0]: reasons.append(f"Critical attendance deficit ({x[0]:.1f}%)")
+    if flags[1]: reasons.append(f"Low internal assessment performance ({x[1]:.1f}/25)")
+    if flags[2]: reasons.append(f"Active backlog accumulation ({int(x[4])} subjects)")
+    if flags[3]: reasons.append(f"Sustained SGPA depression ({sgpa_display})")
+    return reasons or ["Stable performance detected"]
+
+
+def high_risk_contributions(model, X):
+    """
+    Percentage points each feature adds to (or removes from) P(High) for every
+    row of X, shape (n, len(FEATURES)). None when the model cannot attribute
+    its predictions (the legacy sklearn pickle or the rule-based fallback).
+    """
+    if model is None or not hasattr(model, 'contributions') or len(X) == 0:
+        return None
+    class_list = model.classes_.tolist()
+    if 'High' not in class_list:
+        return None
+    _, contrib = model.contributions(X)
+    return contrib[:, :, class_list.index('High')] * 100
+
+
+def top_drivers(contributions, limit=3):
+    """Features that pushed one row toward High, largest first."""
+    order = np.argsort(-contributions)[:limit]
+    return [
+        {"feature": FEATURES[j], "impact": round(float(contributions[j]), 1)}
+        for j in order if contributions[j] > 0
+    ]
+
+
+# --- Incremental scoring ---
+
+def compute_fingerprints(X, model_version, risk_levels, risk_scores):
+    """
+    Hash each student's model inputs together with the model version and the
+    stored outcome. A match means the stored risk is exactly what this model
+    would produce again; any edit to the inputs, a new model, or another writer
+    overwriting risk_level/risk_score changes the hash.
+    """
+    fingerprints = []
+    for row, level, score in zip(X, risk_levels, risk_scores):
+        payload = "|".join(
+            [model_version, str(level), f"{float(score or 0):.2f}"] + [f"{v:.4f}" for v in row]
+        )
+        fingerprints.append(hashlib.sha1(payload.encode("utf-8")).hexdigest())
+    return np.array(fingerprints, dtype=object)
+
+
+def dirty_mask(students, fingerprints):
+    """Boolean mask of students whose stored fingerprint no longer matches."""
+    stored = np.array([s.get('risk_fingerprint') for s in students], dtype=object)
+    return stored != fingerprints
+
+
+# --- Persistence ---
+
+def persist_scores(conn, student_ids, risk_levels, risk_scores, fingerprints=None, model_version=None,
+                   chunk_size=1000):
+    """
+    Write risk results back to `students` in a few round trips.
+
+    Rows are staged into a temporary table with one multi-row INSERT per chunk
+    and applied with a single join UPDATE, committing after each chunk so row
+    locks on `students` are held only briefly. model_version records which
+    model produced the scores.
+    """
+    if fingerprints is None:
+        fingerprints = [None] * len(student_ids)
+    rows = [
+        (sid, str(level), float(score), fp)
+        for sid, level, score, fp in zip(student_ids, risk_levels, risk_scores, fingerprints)
+    ]
+    if not rows:
+        return 0
+
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            CREATE TEMPORARY TABLE IF NOT EXISTS tmp_risk_scores (
+                student_id VARCHAR(50) PRIMARY KEY,
+                risk_level ENUM('Low', 'Medium', 'High'),
+                risk_score DECIMAL(5,2),
+                risk_fingerprint CHAR(40)
+            ) ENGINE=MEMORY
+        """)
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            cur.execute("DELETE FROM tmp_risk_scores")
+            # executemany folds a plain INSERT into one multi-row VALUES statement
+            cur.executemany(
+                "INSERT INTO tmp_risk_scores (student_id, risk_level, risk_score, risk_fingerprint) VALUES (%s, %s, %s, %s)",
+                chunk
+            )
+            cur.execute("""
+                UPDATE students s
+                JOIN tmp_risk_scores t ON s.student_id = t.student_id
+                SET s.risk_level = t.risk_level, s.risk_score = t.risk_score,
+                    s.risk_fingerprint = t.risk_fingerprint, s.risk_model_version = %s
+            """, (model_version,))
+            conn.commit()
+        cur.execute("DROP TEMPORARY TABLE IF EXISTS tmp_risk_scores")
+    finally:
+        cur.close()
+    return len(rows)
@@ -0,0 +1,235 @@
+"""
+scoring_jobs.py
+DB-backed job queue for AI risk scoring.
+
+Jobs are recorded in `ai_scoring_jobs` so every WSGI worker can see their
+status and results; execution happens on a small in-process thread pool so
+HTTP requests never wait on the model. A finished job's result doubles as
+the snapshot served by /api/ai/predict.
+
+While a process holds queued or running jobs, a heartbeat thread stamps their
+`heartbeat_at`; a job whose heartbeat is older than STALE_SECONDS lost its
+process and is failed by the next reader. Status changes only apply from the
+expected state, so an abandoned job can never flip back to done.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from db_connect import get_connection
+
+ALL_SCOPE = "__all__"
+
+# Queued/running jobs without a heartbeat for this long are treated as abandoned (e.g. worker restarted)
+STALE_SECONDS = int(os.environ.get("AI_JOB_STALE_SECONDS", 600))
+HEARTBEAT_SECONDS = max(1, STALE_SECONDS // 4)
+ABANDONED_ERROR = "Risk scoring job was abandoned (server restarted); please run it again"
+# Finished jobs are kept this long so clients can still poll them
+RETENTION_HOURS = int(os.environ.get("AI_JOB_RETENTION_HOURS", 24))
+# How long enqueue waits for another worker queueing the same scope
+ENQUEUE_LOCK_SECONDS = int(os.environ.get("AI_JOB_ENQUEUE_LOCK_SECONDS", 10))
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("AI_JOB_WORKERS", 1)),
+    thread_name_prefix="risk-scoring"
+)
+
+# Jobs this process has queued or is running, kept alive by the heartbeat thread
+_live_jobs = set()
+_live_lock = threading.Lock()
+_heartbeat = None
+
+
+def scope_key(dept_filter):
+    """Scope stored with a job: the department, or ALL_SCOPE for everyone."""
+    return dept_filter or ALL_SCOPE
+
+
+def get_job(conn, job_id):
+    """
+    Fetch a job. A queued/running job whose heartbeat is older than
+    STALE_SECONDS lost its worker (the process restarted), so it is marked
+    failed here rather than left for clients to poll forever.
+    """
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        SELECT id, scope, status, result, error, created_at, started_at, finished_at,
+               COALESCE(heartbeat_at, created_at) < UTC_TIMESTAMP() - INTERVAL %s SECOND AS stale
+        FROM ai_scoring_jobs WHERE id = %s
+    """, (STALE_SECONDS, job_id))
+    job = cur.fetchone()
+    if job and job.pop('stale') and job['status'] in ('queued', 'running'):
+        cur.execute("""
+            UPDATE ai_scoring_jobs
+            SET status = 'failed', error = %s, finished_at = UTC_TIMESTAMP()
+            WHERE id = %s AND status IN ('queued', 'running')
+        """, (ABANDONED_ERROR, job_id))
+        conn.commit()
+        cur.close()
+        return get_job(conn, job_id)
+    cur.close()
+    return job
+
+
+def job_result(job):
+    """Decode the stored payload of a finished job."""
+    return json.loads(job['result']) if job and job['result'] else None
+
+
+def latest_snapshot(conn, dept_filter):
+    """Return (payload, job) for the newest finished job in scope, or None."""
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        SELECT id, scope, status, result, error, created_at, started_at, finished_at
+        FROM ai_scoring_jobs
+        WHERE scope = %s AND status = 'done'
+        ORDER BY finished_at DESC, id DESC
+        LIMIT 1
+    """, (scope_key(dept_filter),))
+    job = cur.fetchone()
+    cur.close()
+    if not job:
+        return None
+    return job_result(job), job
+
+
+def _scope_lock_name(scope):
+    # MySQL lock names are capped at 64 characters; department names are not
+    return "ai_scoring_jobs:" + hashlib.sha1(scope.encode("utf-8")).hexdigest()
+
+
+def enqueue(conn, dept_filter, analysis_fn):
+    """
+    Queue analysis_fn(dept_filter) unless a live job for the same scope is
+    already pending, in which case that job is returned instead.
+
+    The check and the insert run under a per-scope named lock, so workers
+    racing to queue the same scope end up sharing one job.
+    """
+    scope = scope_key(dept_filter)
+    lock_name = _scope_lock_name(scope)
+    cur = conn.cursor(dictionary=True)
+    cur.execute("SELECT GET_LOCK(%s, %s) AS locked", (lock_name, ENQUEUE_LOCK_SECONDS))
+    if not cur.fetchone()['locked']:
+        cur.close()
+        raise RuntimeError("Timed out waiting to queue a risk scoring job; please try again")
+    try:
+        # End any open transaction so the check below sees jobs committed while we waited
+        conn.commit()
+        cur.execute("""
+            SELECT id FROM ai_scoring_jobs
+            WHERE scope = %s AND status IN ('queued', 'running')
+              AND COALESCE(heartbeat_at, created_at) > UTC_TIMESTAMP() - INTERVAL %s SECOND
+            ORDER BY id DESC LIMIT 1
+        """, (scope, STALE_SECONDS))
+        pending = cur.fetchone()
+        if pending:
+            return get_job(conn, pending['id'])
+
+        cur.execute(
+            "INSERT INTO ai_scoring_jobs (scope, status, created_at, heartbeat_at) VALUES (%s, 'queued', UTC_TIMESTAMP(), UTC_TIMESTAMP())",
+            (scope,)
+        )
+        job_id = cur.lastrowid
+        conn.commit()
+    finally:
+        cur.execute("DO RELEASE_LOCK(%s)", (lock_name,))
+        cur.close()
+
+    _track(job_id)
+    _executor.submit(_run_job, job_id, dept_filter, analysis_fn)
+    return get_job(conn, job_id)
+
+
+def _track(job_id):
+    global _heartbeat
+    with _live_lock:
+        _live_jobs.add(job_id)
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_heartbeat_loop, name="risk-scoring-heartbeat", daemon=True)
+            _heartbeat.start()
+
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(HEARTBEAT_SECONDS)
+        with _live_lock:
+            job_ids = list(_live_jobs)
+        if not job_ids:
+            continue
+        conn = None
+        try:
+            conn = get_connection()
+            cur = conn.cursor()
+            fmt = ",".join(["%s"] * len(job_ids))
+            cur.execute(f"""
+                UPDATE ai_scoring_jobs SET heartbeat_at = UTC_TIMESTAMP()
+                WHERE id IN ({fmt}) AND status IN ('queued', 'running')
+            """, job_ids)
+            conn.commit()
+            cur.close()
+        except Exception:
+            print(traceback.format_exc())
+        finally:
+            if conn: conn.close()
+
+
+def _set_status(job_id, status, result=None, error=None):
+    """Move a job queued -> running -> done/failed; returns False if it was no longer in the expected state."""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        if status == 'running':
+            cur.execute("""
+                UPDATE ai_scoring_jobs SET status = 'running', started_at = UTC_TIMESTAMP(), heartbeat_at = UTC_TIMESTAMP()
+                WHERE id = %s AND status = 'queued'
+            """, (job_id,))
+            updated = cur.rowcount > 0
+        else:
+            # A job already failed as abandoned stays failed
+            cur.execute("""
+                UPDATE ai_scoring_jobs
+                SET status = %s, result = %s, error = %s, finished_at = UTC_TIMESTAMP()
+                WHERE id = %s AND status = 'running'
+            """, (status, result, error, job_id))
+            updated = cur.rowcount > 0
+            # Prune old finished jobs, always keeping the latest snapshot per scope
+            cur.execute("""
+                DELETE FROM ai_scoring_jobs
+                WHERE status IN ('done', 'failed')
+                  AND finished_at < UTC_TIMESTAMP() - INTERVAL %s HOUR
+                  AND id NOT IN (
+                      SELECT id FROM (
+                          SELECT MAX(id) AS id FROM ai_scoring_jobs WHERE status = 'done' GROUP BY scope
+                      ) latest
+                  )
+            """, (RETENTION_HOURS,))
+        conn.commit()
+        cur.close()
+        return updated
+    finally:
+        conn.close()
+
+
+def _run_job(job_id, dept_filter, analysis_fn):
+    """Executor entry point: run the analysis and record its outcome."""
+    try:
+        if not _set_status(job_id, 'running'):
+            print(f"Scoring job {job_id} is no longer queued; skipping it")
+            return
+        payload = analysis_fn(dept_filter)
+        # Decimals from MySQL serialise as strings, same as Flask's jsonify
+        _set_status(job_id, 'done', result=json.dumps(payload, default=str))
+    except Exception as e:
+        print(traceback.format_exc())
+        try:
+            _set_status(job_id, 'failed', error=str(e))
+        except Exception:
+            print(traceback.format_exc())
+    finally:
+        with _live_lock:
+            _live_jobs.discard(job_id)
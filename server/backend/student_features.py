@@ -0,0 +1,37 @@
+"""
+student_features.py
+Maintains `student_features`, the per-student aggregates of
+`student_academic_records` read by the risk model, the student list, the
+dashboards and the PDF reports.
+
+Every code path that inserts, updates or deletes academic records calls
+refresh(cur, student_ids) on the same cursor before committing, so the
+aggregates change in the same transaction as the records they summarise.
+A refresh re-aggregates only the given students (a range scan on the
+(student_id, subject_id) key), and readers do a primary-key join instead of
+a GROUP BY over every record.
+"""
+
+# Keeps IN (...) lists well below max_allowed_packet for large uploads
+CHUNK_SIZE = 500
+
+
+def refresh(cur, student_ids):
+    """Recompute the feature row of each given student from their academic records."""
+    ids = list(dict.fromkeys(str(sid) for sid in student_ids if sid is not None and sid != ""))
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        # Delete first so students left with no records drop back to "no data"
+        cur.execute(f"DELETE FROM student_features WHERE student_id IN ({placeholders})", tuple(chunk))
+        cur.execute(f"""
+            INSERT INTO student_features
+                (student_id, avg_attendance, avg_marks, avg_assignment,
+                 attendance_sum, attendance_count, record_count)
+            SELECT student_id,
+                   AVG(attendance_percentage), AVG(internal_marks), AVG(assignment_score),
+                   SUM(attendance_percentage), COUNT(attendance_percentage), COUNT(*)
+            FROM student_academic_records
+            WHERE student_id IN ({placeholders})
+            GROUP BY student_id
+        """, tuple(chunk))
@@ -0,0 +1,208 @@
+"""
+synthetic_data.py
+Vectorized synthetic data for training and load testing.
+
+Every column is drawn as one NumPy array per call, so a million rows take
+seconds instead of minutes. Students follow the same profile mix the model
+has always been trained on (20% High, 30% Medium, 50% Low risk). Fixtures
+add matching `faculties`, `subjects`, `faculty_subjects` and per-subject
+`student_academic_records` rows whose averages land in each student's
+profile, written as CSV plus a LOAD DATA script for bulk loading.
+
+Usage:
+    python synthetic_data.py fixtures --students 100000 --out fixtures/
+    python synthetic_data.py snapshot --rows 1000000 --out models/training/synthetic
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+# (share, label, attendance, internal marks, assignment, sgpa, backlogs [low, high)):
+# the profile mix train_model has always used for its synthetic fallback
+PROFILES = (
+    (0.2, "High", (40, 70), (5, 12), (3, 6), (4.0, 6.0), (2, 6)),
+    (0.3, "Medium", (65, 85), (10, 18), (5, 8), (6.0, 7.5), (0, 3)),
+    (0.5, "Low", (80, 100), (15, 25), (7, 10), (7.5, 10.0), (0, 1)),
+)
+# (department, semesters)
+DEPARTMENTS = (("MCA", 4), ("MBA", 4), ("BCA", 6), ("BTECH", 8))
+SUBJECTS_PER_SEMESTER = 6
+STUDENTS_PER_FACULTY = 40
+# Per-subject spread around a student's profile values
+SUBJECT_NOISE = {"attendance": 6.0, "internal_marks": 2.0, "assignment_score": 0.8}
+FIRST_NAMES = np.array(["Aarav", "Bhavya", "Chirag", "Divya", "Ebin", "Fathima", "Gokul", "Hana", "Irfan",
+                        "Jisha", "Kiran", "Lakshmi", "Muhammed", "Neethu", "Omkar", "Priya", "Rahul", "Sneha"])
+LAST_NAMES = np.array(["Menon", "Nair", "Pillai", "Krishnan", "Thomas", "Rasheed", "Varma", "Suresh",
+                       "Siddiqui", "George", "Babu", "Ashraf", "Rajan", "Desai", "Kurian", "Joseph"])
+
+
+def _profiles(rng, n):
+    shares = np.array([p[0] for p in PROFILES])
+    return np.searchsorted(np.cumsum(shares), rng.random(n), side="right").clip(0, len(PROFILES) - 1)
+
+
+def _column(rng, profile, col, integer=False):
+    low = np.array([p[col][0] for p in PROFILES])[profile]
+    high = np.array([p[col][1] for p in PROFILES])[profile]
+    return rng.integers(low, high) if integer else rng.uniform(low, high)
+
+
+def generate_training_data(num_samples, seed=42):
+    """Return (X, y): an (n, len(FEATURES)) float matrix and matching risk labels."""
+    rng = np.random.default_rng(seed)
+    profile = _profiles(rng, num_samples)
+    X = np.column_stack([
+        _column(rng, profile, 2),
+        _column(rng, profile, 3),
+        _column(rng, profile, 4),
+        _column(rng, profile, 5),
+        _column(rng, profile, 6, integer=True),
+    ]).astype(np.float64)
+    y = np.array([p[1] for p in PROFILES])[profile]
+    return X, y
+
+
+def _names(rng, n):
+    return np.char.add(np.char.add(rng.choice(FIRST_NAMES, n), " "), rng.choice(LAST_NAMES, n))
+
+
+def generate_fixtures(num_students, seed=42):
+    """Return a dict of DataFrames keyed by table name, with consistent ids across tables."""
+    rng = np.random.default_rng(seed)
+    X, labels = generate_training_data(num_students, seed)
+
+    # Subjects: SUBJECTS_PER_SEMESTER per (department, semester), ids assigned in that order
+    dept_names = np.array([d for d, _ in DEPARTMENTS])
+    dept_sems = np.array([s for _, s in DEPARTMENTS])
+    sub_dept = np.repeat(np.arange(len(DEPARTMENTS)), dept_sems * SUBJECTS_PER_SEMESTER)
+    sub_sem = np.concatenate([np.repeat(np.arange(1, s + 1), SUBJECTS_PER_SEMESTER) for s in dept_sems])
+    sub_slot = np.tile(np.arange(1, SUBJECTS_PER_SEMESTER + 1), len(sub_dept) // SUBJECTS_PER_SEMESTER)
+    subject_ids = np.arange(1, len(sub_dept) + 1)
+    codes = np.char.add(np.char.add(dept_names[sub_dept], sub_sem.astype(str)),
+                        np.char.zfill(sub_slot.astype(str), 2))
+    subjects = pd.DataFrame({
+        "id": subject_ids,
+        "code": codes,
+        "name": np.char.add("Subject ", codes),
+        "department": dept_names[sub_dept],
+        "semester": sub_sem.astype(str),
+    })
+    # Semesters in earlier departments, to locate a (department, semester) block of subject ids
+    sem_offset = np.concatenate([[0], np.cumsum(dept_sems)[:-1]])
+
+    # Students spread evenly over departments, semesters uniform within each
+    stu_dept = rng.integers(0, len(DEPARTMENTS), num_students)
+    stu_sem = rng.integers(1, dept_sems[stu_dept] + 1)
+    seq = np.char.zfill(np.arange(1, num_students + 1).astype(str), 7)
+    student_ids = np.char.add(np.char.add(dept_names[stu_dept], "S"), seq)
+    # Stored scores sit in the band the UI shows for each level
+    band_low = np.select([labels == "High", labels == "Medium"], [60, 30], 0)
+    risk_score = rng.uniform(band_low, band_low + np.where(labels == "High", 35, 30))
+    students = pd.DataFrame({
+        "student_id": student_ids,
+        "name": _names(rng, num_students),
+        "department": dept_names[stu_dept],
+        "semester": stu_sem.astype(str),
+        "sgpa": X[:, 3].round(2),
+        "backlogs": X[:, 4].astype(int),
+        "risk_score": risk_score.round(2),
+        "risk_level": labels,
+    })
+
+    # One record per subject of the student's semester, scattered around the profile values
+    base = 1 + (sem_offset[stu_dept] + stu_sem - 1) * SUBJECTS_PER_SEMESTER
+    rec_student = np.repeat(np.arange(num_students), SUBJECTS_PER_SEMESTER)
+    rec_subject = base[rec_student] + np.tile(np.arange(SUBJECTS_PER_SEMESTER), num_students)
+    n_records = len(rec_student)
+    records = pd.DataFrame({
+        "student_id": student_ids[rec_student],
+        "subject_id": rec_subject,
+        "attendance_percentage": np.clip(X[rec_student, 0] + rng.normal(0, SUBJECT_NOISE["attendance"], n_records), 0, 100).round(2),
+        "internal_marks": np.clip(X[rec_student, 1] + rng.normal(0, SUBJECT_NOISE["internal_marks"], n_records), 0, 25).round(2),
+        "assignment_score": np.clip(X[rec_student, 2] + rng.normal(0, SUBJECT_NOISE["assignment_score"], n_records), 0, 10).round(2),
+    })
+
+    # Faculties per department, each teaching a round-robin share of its department's subjects
+    per_dept = np.clip(np.bincount(stu_dept, minlength=len(DEPARTMENTS)) // STUDENTS_PER_FACULTY,
+                       1, dept_sems * SUBJECTS_PER_SEMESTER)
+    fac_dept = np.repeat(np.arange(len(DEPARTMENTS)), per_dept)
+    faculty_ids = np.arange(1, len(fac_dept) + 1)
+    faculties = pd.DataFrame({
+        "id": faculty_ids,
+        "name": _names(rng, len(fac_dept)),
+        "email": np.char.add(np.char.add("faculty", faculty_ids.astype(str)), "@edupredict.test"),
+        "department": dept_names[fac_dept],
+        "designation": rng.choice(["Assistant Professor", "Associate Professor", "Professor"], len(fac_dept)),
+    })
+    dept_first_faculty = np.concatenate([[0], np.cumsum(per_dept)[:-1]])
+    sub_index_in_dept = np.concatenate([np.arange(s * SUBJECTS_PER_SEMESTER) for s in dept_sems])
+    faculty_subjects = pd.DataFrame({
+        "faculty_id": faculty_ids[dept_first_faculty[sub_dept] + sub_index_in_dept % per_dept[sub_dept]],
+        "subject_id": subject_ids,
+    })
+
+    return {
+        "faculties": faculties,
+        "subjects": subjects,
+        "faculty_subjects": faculty_subjects,
+        "students": students,
+        "student_academic_records": records,
+    }
+
+
+def write_fixtures(tables, out_dir):
+    """Write one CSV per table plus load.sql (LOAD DATA LOCAL INFILE, in dependency order)."""
+    os.makedirs(out_dir, exist_ok=True)
+    statements = []
+    for table, df in tables.items():
+        path = os.path.join(out_dir, f"{table}.csv")
+        df.to_csv(path, index=False)
+        statements.append(
+            f"LOAD DATA LOCAL INFILE '{os.path.abspath(path)}' INTO TABLE {table}\n"
+            f"    FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' IGNORE 1 LINES\n"
+            f"    ({', '.join(df.columns)});"
+        )
+    # Bulk loads bypass the write paths, so rebuild the per-student aggregates once at the end
+    statements.append("""INSERT INTO student_features
+    (student_id, avg_attendance, avg_marks, avg_assignment, attendance_sum, attendance_count, record_count)
+SELECT student_id, AVG(attendance_percentage), AVG(internal_marks), AVG(assignment_score),
+       SUM(attendance_percentage), COUNT(attendance_percentage), COUNT(*)
+FROM student_academic_records
+GROUP BY student_id
+ON DUPLICATE KEY UPDATE
+    avg_attendance = VALUES(avg_attendance), avg_marks = VALUES(avg_marks),
+    avg_assignment = VALUES(avg_assignment), attendance_sum = VALUES(attendance_sum),
+    attendance_count = VALUES(attendance_count), record_count = VALUES(record_count);""")
+    with open(os.path.join(out_dir, "load.sql"), "w", encoding="utf-8") as f:
+        f.write("\n\n".join(statements) + "\n")
+
+
+if __name__ == "__main__":
+    import time
+    import training_snapshot
+
+    parser = argparse.ArgumentParser(description="Generate synthetic EduPredict data.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fx = sub.add_parser("fixtures", help="CSV fixtures for every table plus a bulk-load script")
+    fx.add_argument("--students", type=int, default=100000)
+    fx.add_argument("--out", default="fixtures")
+    fx.add_argument("--seed", type=int, default=42)
+    sn = sub.add_parser("snapshot", help="a training snapshot (see training_snapshot.py)")
+    sn.add_argument("--rows", type=int, default=1000000)
+    sn.add_argument("--out", default=os.path.join(training_snapshot.SNAPSHOTS_DIR, "synthetic"))
+    sn.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "fixtures":
+        tables = generate_fixtures(args.students, args.seed)
+        generated = time.perf_counter() - start
+        write_fixtures(tables, args.out)
+        counts = ", ".join(f"{len(df)} {name}" for name, df in tables.items())
+        print(f"Generated {counts} in {generated:.1f}s; wrote {args.out} in {time.perf_counter() - start - generated:.1f}s")
+    else:
+        X, y = generate_training_data(args.rows, args.seed)
+        training_snapshot.save(args.out, X, y, f"synthetic_data.generate_training_data({args.rows}, seed={args.seed})")
+        print(f"Wrote {args.rows} synthetic rows to {args.out} in {time.perf_counter() - start:.1f}s")
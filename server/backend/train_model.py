@@ -1,110 +1,152 @@
 """
 train_model.py
 Trains a RandomForestClassifier using scikit-learn to predict student risk levels.
-If real student data is insufficient, it generates a synthetic dataset.
-The trained model is exported to server/backend/models/risk_model.pkl
+Real data is streamed from the database into a training snapshot first (see
+training_snapshot.py); a saved snapshot can be retrained from without touching
+the database. If real student data is insufficient, it generates a synthetic dataset.
+The trained model is exported to server/backend/models/risk_model.pkl, and a
+NumPy bundle for serving is published to the registry in server/backend/models/registry
+
+Usage:
+    python train_model.py                       # extract a new snapshot, then train
+    python train_model.py --snapshot <dir>      # retrain from an existing snapshot
+    python train_model.py --extract-only        # write the snapshot and stop
+    python train_model.py --search [--latency-budget-ms 20]   # tune hyperparameters with CV first
+    python train_model.py --compress [--min-agreement 0.99]   # ship a smaller model that agrees with the forest
+    python train_model.py --incremental [--trees 10]          # add trees fit on records changed since the last run
+
+Incremental runs extract only students whose academic records changed since
+the watermark stored with the live model version, and warm-start the saved
+forest with a few extra trees fit on those rows. The scaler is kept as is, so
+existing trees stay valid. Once the forest exceeds --max-trees the oldest trees
+are dropped, keeping serving cost flat. Run a full training periodically (or
+after changing features) to rebalance on the whole history.
 """
 
 import os
-import pandas as pd
+import json
+import argparse
+from datetime import datetime, timezone
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report, accuracy_score
 import joblib
-from db_connect import get_connection
+from forest_compiler import compile_forest, load_bundle, verify, checksum
+from risk_engine import FEATURES
+import model_registry
+import training_snapshot
+import model_search
+import model_compression
+import synthetic_data
+import drift_monitor
 
 MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+MODEL_PATH = os.path.join(MODELS_DIR, "risk_model.pkl")
+SCALER_PATH = os.path.join(MODELS_DIR, "scaler.pkl")
+DEFAULT_PARAMS = {"n_estimators": 100, "max_depth": 10}
+# Incremental runs: trees added per run, forest size cap, and the fewest changed rows worth a run
+INCREMENTAL_TREES = 10
+MAX_TREES = 300
+MIN_INCREMENTAL_ROWS = 50
 
-def get_real_data():
-    """Fetch existing historical data from the database."""
-    conn = get_connection()
+def extract_real_data(snapshot_path=None, batch_size=training_snapshot.BATCH_SIZE, since=None):
+    """Stream historical data from the database into a new training snapshot; returns its path or None."""
+    # Imported here so retraining from a snapshot never opens a database pool
+    from db_connect import get_connection
+    try:
+        conn = get_connection()
+    except Exception as e:
+        print(f"Error fetching real data: {e}")
+        return None
     try:
-        query = """
-            SELECT attendance_percentage, internal_marks, assignment_score, sgpa, backlogs, risk_level
-            FROM students
-            WHERE risk_level IS NOT NULL
-        """
-        df = pd.read_sql(query, conn)
-        return df
+        path, meta = training_snapshot.extract(conn, snapshot_path, batch_size=batch_size, since=since)
+        changed = f" changed since {since}" if since else ""
+        print(f"Extracted {meta['n_rows']} labelled records{changed} to snapshot {path}")
+        return path
     except Exception as e:
         print(f"Error fetching real data: {e}")
-        return pd.DataFrame()
+        return None
     finally:
         conn.close()
 
 def generate_synthetic_data(num_samples=1000):
     """Generate synthetic data to train the model if there isn't enough real data."""
     print(f"Generating {num_samples} synthetic student records for robust training...")
-    np.random.seed(42)
-    
-    # Generate features
     # High risk: low attendance, low marks, low SGPA, high backlogs
     # Medium risk: average everything
     # Low risk: high attendance, high marks, high SGPA, zero/low backlogs
-    
-    data = []
-    
-    for _ in range(num_samples):
-        # 20% high risk, 30% medium risk, 50% low risk
-        rand = np.random.random()
-        
-        if rand < 0.2: # High Risk Profile
-            attendance = np.random.uniform(40, 70)
-            internal = np.random.uniform(5, 12)
-            assignment = np.random.uniform(3, 6)
-            sgpa = np.random.uniform(4.0, 6.0)
-            backlogs = np.random.randint(2, 6)
-            risk = "High"
-        elif rand < 0.5: # Medium Risk Profile
-            attendance = np.random.uniform(65, 85)
-            internal = np.random.uniform(10, 18)
-            assignment = np.random.uniform(5, 8)
-            sgpa = np.random.uniform(6.0, 7.5)
-            backlogs = np.random.randint(0, 3)
-            risk = "Medium"
-        else: # Low Risk Profile
-            attendance = np.random.uniform(80, 100)
-            internal = np.random.uniform(15, 25)
-            assignment = np.random.uniform(7, 10)
-            sgpa = np.random.uniform(7.5, 10.0)
-            backlogs = np.random.randint(0, 1)
-            risk = "Low"
-            
-        data.append({
-            "attendance_percentage": attendance,
-            "internal_marks": internal,
-            "assignment_score": assignment,
-            "sgpa": sgpa,
-            "backlogs": backlogs,
-            "risk_level": risk
-        })
-        
-    return pd.DataFrame(data)
-
-def train_and_save():
+    X, y = synthetic_data.generate_training_data(num_samples, seed=42)
+    return X, y
+
+def tune_hyperparameters(X_train, y_train, folds=5, workers=None, latency_budget_ms=None):
+    """Run the CV search on the training split and save its report next to the snapshots."""
+    params, results = model_search.search(
+        X_train, y_train, folds=folds, workers=workers, latency_budget_ms=latency_budget_ms
+    )
+    model_search.print_results(results)
+
+    os.makedirs(training_snapshot.SNAPSHOTS_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report_path = os.path.join(training_snapshot.SNAPSHOTS_DIR, f"search-{stamp}.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"latency_budget_ms": latency_budget_ms, "folds": folds, "selected": params,
+                   "results": results}, f, indent=2)
+    print(f"\nSelected {params}; full report in {report_path}")
+    return params
+
+def compress_model(model, scaler, X_train, X_test, y_test, min_agreement):
+    """Swap the trained forest for the fastest smaller model that still agrees with it."""
+    print("\nCompressing model for serving...")
+    before = model_compression.serving_profile(model, scaler, X_test)
+    compressed, name, candidates = model_compression.compress(
+        model, scaler, X_train, X_test, min_agreement=min_agreement
+    )
+    after = model_compression.serving_profile(compressed, scaler, X_test)
+    model_compression.print_report(candidates, before, after, name, min_agreement)
+    if compressed is not model:
+        acc = accuracy_score(y_test, compressed.predict(scaler.transform(X_test)))
+        print(f"\nCompressed Model Accuracy: {acc:.4f}")
+    return compressed
+
+def save_and_publish(model, scaler, training):
+    """Save the sklearn model and scaler, then publish, verify and activate the serving bundle."""
     os.makedirs(MODELS_DIR, exist_ok=True)
-    model_path = os.path.join(MODELS_DIR, "risk_model.pkl")
-    scaler_path = os.path.join(MODELS_DIR, "scaler.pkl")
-    
-    df = get_real_data()
+    joblib.dump(model, MODEL_PATH)
+    joblib.dump(scaler, SCALER_PATH)
+    print(f"\nSaved model to {MODEL_PATH}")
+    print(f"Saved scaler to {SCALER_PATH}")
+
+    # Publish the serving bundle (scaler folded into the trees) to the model registry.
+    # It is checked before going live; running services pick it up without a restart.
+    version = model_registry.publish(compile_forest(model, scaler), model.classes_, FEATURES,
+                                     activate=False, training=training)
+    agreement = verify(model, scaler, load_bundle(model_registry.bundle_path(version)))
+    if agreement < 0.999:
+        raise RuntimeError(f"Model bundle agrees with sklearn on only {agreement:.2%} of rows")
+    model_registry.set_current(version)
+    print(f"Published model version {version} to {model_registry.REGISTRY_DIR}")
+    return version
+
+def train_and_save(snapshot_path=None, batch_size=training_snapshot.BATCH_SIZE, search=False, folds=5,
+                   workers=None, latency_budget_ms=None, compress=False,
+                   min_agreement=model_compression.DEFAULT_MIN_AGREEMENT):
+    if snapshot_path is None:
+        snapshot_path = extract_real_data(batch_size=batch_size)
+    X, y = np.empty((0, len(FEATURES))), np.empty(0, dtype=str)
+    snapshot_meta = {}
+    if snapshot_path:
+        # Rows with missing features were already dropped during extraction
+        X, y, snapshot_meta = training_snapshot.load(snapshot_path)
     
     # If we have less than 100 rows, use synthetic data to build a robust model
-    if len(df) < 100:
-        print(f"Found only {len(df)} real records. Falling back to synthetic training data.")
-        df = generate_synthetic_data(1000)
+    if len(X) < 100:
+        print(f"Found only {len(X)} real records. Falling back to synthetic training data.")
+        X, y = generate_synthetic_data(1000)
+        snapshot_path, snapshot_meta = None, {}
     else:
-        print(f"Training on {len(df)} real records from database.")
-        
-    # Prepare X and y
-    features = ['attendance_percentage', 'internal_marks', 'assignment_score', 'sgpa', 'backlogs']
-    
-    # Drop rows with NaN in critical columns
-    df = df.dropna(subset=features + ['risk_level'])
-    
-    X = df[features]
-    y = df['risk_level']
+        print(f"Training on {len(X)} real records from snapshot {snapshot_path}.")
     
     # Split data
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
@@ -114,9 +156,15 @@ def train_and_save():
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
     
+    # Pick hyperparameters on the training split only; the test split stays untouched
+    params = DEFAULT_PARAMS
+    if search:
+        params = tune_hyperparameters(X_train, y_train, folds=folds, workers=workers,
+                                      latency_budget_ms=latency_budget_ms)
+    
     # Train Random Forest
-    print("Training Random Forest Classifier...")
-    model = RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42)
+    print(f"Training Random Forest Classifier with {params}...")
+    model = RandomForestClassifier(random_state=42, n_jobs=-1, **params)
     model.fit(X_train_scaled, y_train)
     
     # Evaluate
@@ -126,11 +174,112 @@ def train_and_save():
     print("\nClassification Report:")
     print(classification_report(y_test, y_pred))
     
-    # Save Model and Scaler
-    joblib.dump(model, model_path)
-    joblib.dump(scaler, scaler_path)
-    print(f"\nSaved model to {model_path}")
-    print(f"Saved scaler to {scaler_path}")
+    if compress:
+        model = compress_model(model, scaler, X_train, X_test, y_test, min_agreement)
+    
+    save_and_publish(model, scaler, {
+        "mode": "full",
+        "rows": int(len(X)),
+        "snapshot": snapshot_path,
+        "watermark": snapshot_meta.get("watermark"),
+        "accuracy": float(acc),
+        # Drift baseline: histograms of everything the model was trained on
+        "reference": drift_monitor.reference_profile(X, y),
+    })
+
+def _merged_reference(live_meta, X_new, y_new):
+    """Drift baseline after an incremental run: the live model's reference plus the new rows."""
+    delta = drift_monitor.reference_profile(X_new, y_new)
+    base = live_meta["training"].get("reference")
+    return drift_monitor.merge_profiles(base, delta) if base else delta
+
+def train_incremental(snapshot_path=None, batch_size=training_snapshot.BATCH_SIZE, trees=INCREMENTAL_TREES,
+                      max_trees=MAX_TREES, min_rows=MIN_INCREMENTAL_ROWS):
+    """
+    Grow the live forest with trees fit on records changed since its watermark.
+    Returns the new version, or None when there is nothing (or not enough) to train on.
+    """
+    live = model_registry.current_meta()
+    watermark = ((live or {}).get("training") or {}).get("watermark")
+    if not watermark:
+        raise RuntimeError("The live model has no data watermark; run a full training first.")
+
+    model = joblib.load(MODEL_PATH)
+    scaler = joblib.load(SCALER_PATH)
+    if not hasattr(model, "estimators_"):
+        raise RuntimeError("The saved model is not a forest (was it compressed?); run a full training first.")
+    # New trees are only meaningful on top of the exact forest being served
+    if checksum(compile_forest(model, scaler))[:12] != model_registry.current_version():
+        raise RuntimeError("Saved model does not match the live registry version; run a full training first.")
+
+    if snapshot_path is None:
+        snapshot_path = extract_real_data(batch_size=batch_size, since=watermark)
+    if not snapshot_path:
+        return None
+    X_new, y_new, snapshot_meta = training_snapshot.load(snapshot_path, mmap_mode=None)
+
+    # Rows stay pending (the watermark is not advanced) until a run can use them
+    if len(X_new) < min_rows:
+        print(f"Only {len(X_new)} records changed since {watermark}; need {min_rows}. Nothing to do.")
+        return None
+    missing = sorted(set(model.classes_) - set(np.unique(y_new)))
+    if missing:
+        # Warm-started trees must see every class, or their outputs will not line up with the forest's
+        print(f"Changed records have no {', '.join(missing)} examples yet; waiting for more data.")
+        return None
+
+    X_new_scaled = scaler.transform(X_new)
+    prev_acc = accuracy_score(y_new, model.predict(X_new_scaled))
+    print(f"Live model accuracy on {len(X_new)} changed records: {prev_acc:.4f}")
+
+    print(f"Adding {trees} trees to the {len(model.estimators_)}-tree forest...")
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + trees)
+    model.fit(X_new_scaled, y_new)
+    model.set_params(warm_start=False)
+    if len(model.estimators_) > max_trees:
+        # Drop the oldest trees so the forest (and serving cost) stays bounded
+        dropped = len(model.estimators_) - max_trees
+        model.estimators_ = model.estimators_[dropped:]
+        model.n_estimators = max_trees
+        print(f"Dropped the {dropped} oldest trees (cap {max_trees}).")
+
+    return save_and_publish(model, scaler, {
+        "mode": "incremental",
+        "rows": int(len(X_new)),
+        "snapshot": snapshot_path,
+        "since": watermark,
+        "watermark": snapshot_meta.get("watermark") or watermark,
+        "base_version": model_registry.current_version(),
+        "accuracy_before": float(prev_acc),
+        "reference": _merged_reference(live, X_new, y_new),
+    })
 
 if __name__ == "__main__":
-    train_and_save()
+    parser = argparse.ArgumentParser(description="Train the student risk model.")
+    parser.add_argument("--snapshot", help="train from this snapshot directory instead of extracting a new one")
+    parser.add_argument("--extract-only", action="store_true", help="write a training snapshot and exit")
+    parser.add_argument("--batch-size", type=int, default=training_snapshot.BATCH_SIZE,
+                        help="rows fetched from MySQL per batch during extraction")
+    parser.add_argument("--search", action="store_true", help="choose hyperparameters by cross-validated search")
+    parser.add_argument("--folds", type=int, default=5, help="cross-validation folds for --search")
+    parser.add_argument("--workers", type=int, help="search processes (default: all cores)")
+    parser.add_argument("--latency-budget-ms", type=float,
+                        help=f"max compiled-forest time to score {model_search.LATENCY_BATCH} students")
+    parser.add_argument("--compress", action="store_true", help="prune/distill the model before publishing")
+    parser.add_argument("--min-agreement", type=float, default=model_compression.DEFAULT_MIN_AGREEMENT,
+                        help="share of held-out risk levels the compressed model must keep")
+    parser.add_argument("--incremental", action="store_true",
+                        help="add trees fit on records changed since the live model's watermark")
+    parser.add_argument("--trees", type=int, default=INCREMENTAL_TREES, help="trees added by --incremental")
+    parser.add_argument("--max-trees", type=int, default=MAX_TREES,
+                        help="forest size cap for --incremental; the oldest trees are dropped")
+    args = parser.parse_args()
+
+    if args.extract_only:
+        extract_real_data(args.snapshot, batch_size=args.batch_size)
+    elif args.incremental:
+        train_incremental(args.snapshot, batch_size=args.batch_size, trees=args.trees, max_trees=args.max_trees)
+    else:
+        train_and_save(args.snapshot, batch_size=args.batch_size, search=args.search, folds=args.folds,
+                       workers=args.workers, latency_budget_ms=args.latency_budget_ms,
+                       compress=args.compress, min_agreement=args.min_agreement)
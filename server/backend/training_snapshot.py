@@ -0,0 +1,223 @@
+"""
+training_snapshot.py
+Streams labelled training rows out of MySQL into an on-disk columnar snapshot.
+
+A snapshot is a directory holding:
+    X.npy       float64 (n, len(FEATURES))   model inputs, same columns as serving
+    y.npy       int8    (n,)                 index into meta["classes"]
+    meta.json   classes, features, row count, query, watermark, checksum, created_at
+
+Features come from `student_features`, the same per-subject aggregates the
+risk analysis scores, so training and serving see identical inputs. Rows are
+read with an unbuffered cursor in fixed-size batches and written straight
+into memory-mapped .npy files sized from a COUNT taken in the same consistent
+read snapshot, so memory use is bounded by the batch size, not the history.
+Retraining from a snapshot never touches the database. save() writes rows
+already in memory, such as synthetic_data.py output, in the same format.
+
+The watermark is the database clock when the snapshot was taken, minus
+WATERMARK_LAG_SECONDS. Passing it back as `since` extracts only students whose
+records changed after it, which is what incremental retraining consumes.
+updated_at is stamped when a row is written, not when its transaction commits,
+so a long write (a batch upload hashing passwords for minutes) can commit rows
+stamped well before a snapshot that could not see them; the lag keeps those
+rows above the next `since`. Rows inside the lag window are read again by the
+next extraction, which only adds duplicate training rows.
+
+Usage: python training_snapshot.py [out_dir]   # extract only
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import tempfile
+from datetime import datetime, timezone
+import numpy as np
+from risk_engine import FEATURES
+
+SNAPSHOTS_DIR = os.path.join(os.path.dirname(__file__), "models", "training")
+SNAPSHOT_FORMAT = "edupredict-training-snapshot/1"
+# sklearn orders classes alphabetically; keep the same codes everywhere
+CLASSES = ("High", "Low", "Medium")
+BATCH_SIZE = int(os.environ.get("TRAIN_EXTRACT_BATCH_SIZE", 5000))
+
+SOURCE_SQL = """
+    FROM students s
+    JOIN student_features f ON f.student_id = s.student_id
+    WHERE s.risk_level IN ('High', 'Low', 'Medium')
+"""
+
+EXTRACT_SQL = """
+    SELECT f.avg_attendance, f.avg_marks, f.avg_assignment, s.sgpa, s.backlogs, s.risk_level
+""" + SOURCE_SQL + """{since}
+    ORDER BY s.student_id
+"""
+# A student changes when their features are refreshed or their own row (sgpa,
+# backlogs, label) is edited, so both tables' updated_at count.
+# >= rather than >: updated_at has one-second resolution, so a row stamped in the
+# watermark's own second must still be picked up next time. Rows
+# at the boundary may be seen twice, which only adds a duplicate training row.
+SINCE_SQL = "\n    AND GREATEST(f.updated_at, s.updated_at) >= %s"
+WATERMARK_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Longer than any write transaction that touches students or student_features
+WATERMARK_LAG_SECONDS = int(os.environ.get("TRAIN_WATERMARK_LAG_SECONDS", 3600))
+
+
+def _file_digest(path, digest):
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+
+
+def snapshot_checksum(path):
+    """SHA-256 over X.npy and y.npy as stored."""
+    digest = hashlib.sha256()
+    for name in ("X.npy", "y.npy"):
+        _file_digest(os.path.join(path, name), digest)
+    return digest.hexdigest()
+
+
+def default_path(prefix=""):
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return os.path.join(SNAPSHOTS_DIR, prefix + stamp)
+
+
+def extract(conn, path=None, batch_size=BATCH_SIZE, since=None):
+    """
+    Write a snapshot of every labelled student to path (a new directory) and
+    return (path, meta). Rows missing any feature are skipped, as before.
+    With since (a watermark string), only students whose features or student
+    row were updated at or after it are included.
+    """
+    path = path or default_path("delta-" if since else "")
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    codes = {label: i for i, label in enumerate(CLASSES)}
+    since_sql, params = (SINCE_SQL, (since,)) if since else ("", ())
+    query = EXTRACT_SQL.format(since=since_sql)
+
+    try:
+        # COUNT and the streamed rows must see the same data
+        conn.start_transaction(consistent_snapshot=True, isolation_level="REPEATABLE READ", readonly=True)
+        cur = conn.cursor()
+        # Rows committed after this snapshot may carry updated_at up to WATERMARK_LAG_SECONDS older
+        cur.execute("SELECT UTC_TIMESTAMP() - INTERVAL %s SECOND", (WATERMARK_LAG_SECONDS,))
+        watermark = cur.fetchone()[0].strftime(WATERMARK_FORMAT)
+        if since and since > watermark:
+            watermark = since  # never move backwards
+        cur.execute("SELECT COUNT(*) " + SOURCE_SQL + since_sql, params)
+        capacity = int(cur.fetchone()[0])
+
+        X = np.lib.format.open_memmap(os.path.join(tmp_dir, "X.npy"), mode="w+",
+                                      dtype=np.float64, shape=(capacity, len(FEATURES)))
+        y = np.lib.format.open_memmap(os.path.join(tmp_dir, "y.npy"), mode="w+",
+                                      dtype=np.int8, shape=(capacity,))
+
+        cur.execute(query, params)
+        n = 0
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            batch = np.array([r[:5] for r in rows], dtype=np.float64)  # None -> nan
+            keep = ~np.isnan(batch).any(axis=1)
+            kept = int(keep.sum())
+            X[n:n + kept] = batch[keep]
+            y[n:n + kept] = [codes[r[5]] for r, k in zip(rows, keep) if k]
+            n += kept
+        cur.close()
+        conn.rollback()  # end the read-only snapshot
+        X.flush()
+        y.flush()
+        del X, y
+
+        if n < capacity:
+            # Some rows had missing features; shrink the files to what was written
+            _truncate(tmp_dir, n)
+
+        meta = _finalize(tmp_dir, path, n, " ".join(query.split()), watermark, since)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return path, meta
+
+
+def save(path, X, y, source):
+    """Write in-memory rows (e.g. synthetic data) as a snapshot; y holds class labels."""
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    classes = np.asarray(CLASSES)
+    y = np.asarray(y)
+    if not np.isin(y, classes).all():
+        raise ValueError(f"Labels must be one of {CLASSES}")
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        np.save(os.path.join(tmp_dir, "X.npy"), np.ascontiguousarray(X, dtype=np.float64))
+        # CLASSES is sorted, so searchsorted gives each label's code
+        np.save(os.path.join(tmp_dir, "y.npy"), np.searchsorted(classes, y).astype(np.int8))
+        meta = _finalize(tmp_dir, path, len(X), source)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return path, meta
+
+
+def _finalize(tmp_dir, path, n_rows, source, watermark=None, since=None):
+    """Write meta.json (last, so its presence marks a complete snapshot) and move the snapshot into place."""
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "classes": list(CLASSES),
+        "features": list(FEATURES),
+        "n_rows": n_rows,
+        "query": source,
+        "since": since,
+        "watermark": watermark,
+        "checksum": snapshot_checksum(tmp_dir),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.chmod(tmp_dir, 0o755)
+    os.replace(tmp_dir, path)
+    return meta
+
+
+def _truncate(path, n):
+    """Rewrite X.npy / y.npy keeping the first n rows, one column block at a time."""
+    for name in ("X.npy", "y.npy"):
+        src = np.load(os.path.join(path, name), mmap_mode="r")
+        dst_path = os.path.join(path, f".{name}")
+        dst = np.lib.format.open_memmap(dst_path, mode="w+", dtype=src.dtype, shape=(n,) + src.shape[1:])
+        for start in range(0, n, BATCH_SIZE):
+            dst[start:start + BATCH_SIZE] = src[start:min(start + BATCH_SIZE, n)]
+        dst.flush()
+        del src, dst
+        os.replace(dst_path, os.path.join(path, name))
+
+
+def load(path, mmap_mode="r"):
+    """Return (X, y_labels, meta) from a snapshot; raises ValueError if it fails validation."""
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported training snapshot format: {meta.get('format')}")
+    if meta["features"] != list(FEATURES):
+        raise ValueError(f"Snapshot features {meta['features']} do not match {FEATURES}")
+    if snapshot_checksum(path) != meta["checksum"]:
+        raise ValueError("Training snapshot checksum mismatch")
+    X = np.load(os.path.join(path, "X.npy"), mmap_mode=mmap_mode)
+    y = np.asarray(meta["classes"])[np.load(os.path.join(path, "y.npy"))]
+    return X, y, meta
+
+
+if __name__ == "__main__":
+    from db_connect import get_connection
+    conn = get_connection()
+    try:
+        out, meta = extract(conn, sys.argv[1] if len(sys.argv) > 1 else None)
+    finally:
+        conn.close()
+    print(f"Wrote {meta['n_rows']} rows to {out}")
@@ -0,0 +1,173 @@
+"""
+Migration: AI risk scoring state
+- Adds `risk_fingerprint` to `students` so unchanged students can skip rescoring
+- Creates `ai_scoring_jobs` for background scoring runs and their snapshots
+- Adds `risk_model_version` to `students` to record which model produced each score
+- Creates `student_features` (per-student academic averages kept current on write) and backfills it
+- Creates `ai_drift_stats` for the flushed feature / prediction histograms of the drift monitor
+- Creates `app_data_versions`, the counter bumped on student / academic record writes to invalidate cached analyses
+- Adds the composite indexes behind keyset pagination of /api/students (risk and recent orders, with and
+  without a department prefix); NULL risk scores are set to 0 first so every row has a sort key
+- Adds `heartbeat_at` to `ai_scoring_jobs` so live jobs are told apart from ones whose worker died
+- Adds `updated_at` to `students` on databases created before schema.sql had it; incremental training
+  extracts use it to see edits to sgpa, backlogs and labels
+"""
+import os
+from dotenv import load_dotenv
+import mysql.connector
+
+load_dotenv()
+
+conn = mysql.connector.connect(
+    host=os.environ["DB_HOST"],
+    user=os.environ["DB_USER"],
+    password=os.environ["DB_PASSWORD"],
+    database=os.environ["DB_NAME"]
+)
+cur = conn.cursor()
+
+steps = [
+    (
+        "Add `risk_fingerprint` to `students`",
+        """
+        ALTER TABLE students
+            ADD COLUMN risk_fingerprint CHAR(40) NULL;
+        """
+    ),
+    (
+        "Create `ai_scoring_jobs` table",
+        """
+        CREATE TABLE IF NOT EXISTS ai_scoring_jobs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            scope VARCHAR(100) NOT NULL,
+            status ENUM('queued', 'running', 'done', 'failed') NOT NULL DEFAULT 'queued',
+            result LONGTEXT NULL,
+            error TEXT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP NULL,
+            finished_at TIMESTAMP NULL,
+            INDEX idx_scope_status (scope, status, finished_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    ),
+    (
+        "Add `risk_model_version` to `students`",
+        """
+        ALTER TABLE students
+            ADD COLUMN risk_model_version VARCHAR(32) NULL;
+        """
+    ),
+    (
+        "Create `student_features` table",
+        """
+        CREATE TABLE IF NOT EXISTS student_features (
+            student_id VARCHAR(50) PRIMARY KEY,
+            avg_attendance DOUBLE NULL,
+            avg_marks DOUBLE NULL,
+            avg_assignment DOUBLE NULL,
+            attendance_sum DOUBLE NULL,
+            attendance_count INT NOT NULL DEFAULT 0,
+            record_count INT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    ),
+    (
+        "Backfill `student_features` from `student_academic_records`",
+        """
+        INSERT INTO student_features
+            (student_id, avg_attendance, avg_marks, avg_assignment,
+             attendance_sum, attendance_count, record_count)
+        SELECT student_id,
+               AVG(attendance_percentage), AVG(internal_marks), AVG(assignment_score),
+               SUM(attendance_percentage), COUNT(attendance_percentage), COUNT(*)
+        FROM student_academic_records
+        GROUP BY student_id
+        ON DUPLICATE KEY UPDATE
+            avg_attendance = VALUES(avg_attendance),
+            avg_marks = VALUES(avg_marks),
+            avg_assignment = VALUES(avg_assignment),
+            attendance_sum = VALUES(attendance_sum),
+            attendance_count = VALUES(attendance_count),
+            record_count = VALUES(record_count);
+        """
+    ),
+    (
+        "Create `ai_drift_stats` table",
+        """
+        CREATE TABLE IF NOT EXISTS ai_drift_stats (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            model_version VARCHAR(32) NOT NULL,
+            department VARCHAR(100) NOT NULL,
+            window_start TIMESTAMP NOT NULL,
+            window_end TIMESTAMP NOT NULL,
+            n_rows INT NOT NULL,
+            feature_counts TEXT NOT NULL,
+            class_counts VARCHAR(255) NOT NULL,
+            INDEX idx_version_window (model_version, window_end)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    ),
+    (
+        "Create `app_data_versions` table",
+        """
+        CREATE TABLE IF NOT EXISTS app_data_versions (
+            name VARCHAR(50) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    ),
+    (
+        "Backfill NULL `students.risk_score` with 0",
+        """
+        UPDATE students SET risk_score = 0 WHERE risk_score IS NULL;
+        """
+    ),
+    (
+        "Index `students` for the recent-first student list",
+        """
+        ALTER TABLE students
+            ADD INDEX idx_students_recent (created_at, student_id),
+            ADD INDEX idx_students_dept_recent (department, created_at, student_id);
+        """
+    ),
+    (
+        "Index `students` for the risk-ordered student list",
+        """
+        ALTER TABLE students
+            ADD INDEX idx_students_risk (risk_score DESC, name, student_id),
+            ADD INDEX idx_students_dept_risk (department, risk_score DESC, name, student_id);
+        """
+    ),
+    (
+        "Add `heartbeat_at` to `ai_scoring_jobs`",
+        """
+        ALTER TABLE ai_scoring_jobs
+            ADD COLUMN heartbeat_at TIMESTAMP NULL;
+        """
+    ),
+    (
+        "Add `updated_at` to `students`",
+        """
+        ALTER TABLE students
+            ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
+        """
+    ),
+]
+
+for label, sql in steps:
+    try:
+        cur.execute(sql)
+        conn.commit()
+        print(f"[OK]  {label}")
+    except mysql.connector.Error as e:
+        # 1060 = Duplicate column, 1061 = Duplicate key, 1050 = Table exists — safe to ignore
+        if e.errno in (1060, 1061, 1050):
+            print(f"[SKIP] {label} — already applied ({e.msg})")
+        else:
+            print(f"[ERR]  {label} — {e}")
+            raise
+
+cur.close()
+conn.close()
+print("\nMigration complete.")
@@ -1,7 +1,13 @@
-from flask import session
+from flask import session, g
 from db_connect import get_connection
 from datetime import datetime
+import os
 import mysql.connector
+from result_cache import TTLCache
+
+# user_id -> principal. Edits made through another worker are picked up within this many seconds
+PRINCIPAL_TTL = int(os.environ.get("PRINCIPAL_CACHE_TTL", 60))
+_principals = TTLCache(maxsize=4096, ttl=PRINCIPAL_TTL)
 
 def check_admin():
     """Helper to check if current session is an admin."""
@@ -11,18 +17,54 @@ def check_admin():
         return False, "Forbidden. Admin access required.", 403
     return True, None, None
 
+def get_principal(conn):
+    """
+    The logged-in user as {user_id, role, email, faculty_id, name, department,
+    designation, class_id} (faculty fields are None for non-faculty users), or
+    None. Resolved once per request and cached per process for PRINCIPAL_TTL
+    seconds; call invalidate_principals() after changing users or faculties.
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return None
+    principal = g.get("principal")
+    if principal is not None and principal["user_id"] == user_id:
+        return principal
+    principal = _principals.get(user_id)
+    if principal is None:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT u.id AS user_id, u.role, u.email, f.id AS faculty_id, f.name, f.department,
+                   f.designation, f.class_id
+            FROM users u
+            LEFT JOIN faculties f ON f.email = u.email
+            WHERE u.id = %s
+            LIMIT 1
+        """, (user_id,))
+        principal = cur.fetchone()
+        cur.close()
+        if principal is None:
+            return None
+        _principals.put(user_id, principal)
+    g.principal = principal
+    return principal
+
+def invalidate_principals():
+    """Drop cached principals; call after committing changes to users or faculties."""
+    _principals.clear()
+    g.pop("principal", None)
+
+def get_faculty_department(conn):
+    """Department of the logged-in faculty member, or None if they have none."""
+    principal = get_principal(conn)
+    return (principal["department"] or None) if principal else None
+
 def get_faculty_class_id(conn):
     """If the logged-in user is FACULTY, return their class_id; else None."""
     if session.get("role") != "FACULTY":
         return None
-    email = session.get("email")
-    if not email:
-        return None
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT class_id FROM faculties WHERE email = %s", (email,))
-    row = cur.fetchone()
-    cur.close()
-    return row["class_id"] if row else None
+    principal = get_principal(conn)
+    return principal["class_id"] if principal else None
 
 def generate_student_id(conn, department):
     """
@@ -10,7 +10,6 @@ import toast from 'react-hot-toast';
 import { 
   getDashboardSummary, 
   getRiskDistribution, 
-  getDashboardStudents, 
   getFacultyProfile, 
   runRiskPrediction, 
   importStudents 
@@ -19,7 +18,6 @@ import {
 const DashboardHome = () => {
   const [summary, setSummary] = useState(null);
   const [distribution, setDistribution] = useState(null);
-  const [students, setStudents] = useState([]);
   const [facultyProfile, setFacultyProfile] = useState(null);
   const [loading, setLoading] = useState(true);
   const [showAddModal, setShowAddModal] = useState(false);
@@ -28,19 +26,14 @@ const DashboardHome = () => {
   const fetchData = async () => {
     setLoading(true);
     try {
-      const [summaryRes, distRes, studentsRes, profileRes] = await Promise.all([
+      const [summaryRes, distRes, profileRes] = await Promise.all([
         getDashboardSummary(),
         getRiskDistribution(),
-        getDashboardStudents(),
         getFacultyProfile()
       ]);
 
       setSummary(summaryRes);
       setDistribution(Array.isArray(distRes) ? distRes : []);
-      
-      if (studentsRes && Array.isArray(studentsRes.students)) {
-        setStudents(studentsRes.students);
-      }
 
       setFacultyProfile(profileRes);
     } catch (error) {
@@ -203,7 +196,6 @@ const DashboardHome = () => {
       {selectedRiskLevel && (
         <RiskDrillDownModal
           riskLevel={selectedRiskLevel}
-          students={students}
           onClose={() => setSelectedRiskLevel(null)}
         />
       )}
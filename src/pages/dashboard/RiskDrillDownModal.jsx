@@ -1,13 +1,38 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 import { X, Users, AlertCircle } from 'lucide-react';
 import './DashboardComponents.css';
+import { getDashboardStudents } from '../../services/api';
 
-const RiskDrillDownModal = ({ riskLevel, students, onClose }) => {
-    if (!riskLevel) return null;
+const PAGE_SIZE = 50;
+
+const RiskDrillDownModal = ({ riskLevel, onClose }) => {
+    const [filteredStudents, setFilteredStudents] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loading, setLoading] = useState(true);
 
     // Normalize riskLevel to match data (e.g., "High Risk" -> "High")
-    const normalizedLevel = riskLevel.includes(' ') ? riskLevel.split(' ')[0] : riskLevel;
-    const filteredStudents = students.filter(s => s.risk_level === normalizedLevel);
+    const normalizedLevel = riskLevel && riskLevel.includes(' ') ? riskLevel.split(' ')[0] : riskLevel;
+
+    // The server filters by risk level and returns one page at a time
+    const fetchPage = async (cursor) => {
+        setLoading(true);
+        try {
+            const data = await getDashboardStudents({ risk_level: normalizedLevel, sort: 'risk', limit: PAGE_SIZE, cursor });
+            const page = Array.isArray(data.students) ? data.students : [];
+            setFilteredStudents((prev) => (cursor ? [...prev, ...page] : page));
+            setNextCursor(data.next_cursor || null);
+        } catch (err) {
+            console.error('Error fetching students:', err);
+        } finally {
+            setLoading(false);
+        }
+    };
+
+    useEffect(() => {
+        if (normalizedLevel) fetchPage(null);
+    }, [normalizedLevel]);
+
+    if (!riskLevel) return null;
 
     return (
         <div className="modal-overlay centered" onClick={onClose}>
@@ -22,7 +47,9 @@ const RiskDrillDownModal = ({ riskLevel, students, onClose }) => {
 
                 <div className="modal-body scrollable">
                     <div className="drilldown-summary">
-                        Found {filteredStudents.length} students in this category.
+                        {loading && filteredStudents.length === 0
+                            ? 'Loading students...'
+                            : `Showing ${filteredStudents.length}${nextCursor ? '+' : ''} students in this category.`}
                     </div>
 
                     <div className="drilldown-list">
@@ -48,10 +75,18 @@ const RiskDrillDownModal = ({ riskLevel, students, onClose }) => {
                                 </tbody>
                             </table>
                         ) : (
-                            <div className="empty-state">No students found in this category.</div>
+                            !loading && <div className="empty-state">No students found in this category.</div>
                         )}
                     </div>
 
+                    {nextCursor && (
+                        <div className="modal-actions">
+                            <button className="btn-outline" onClick={() => fetchPage(nextCursor)} disabled={loading}>
+                                {loading ? 'Loading...' : 'Load more'}
+                            </button>
+                        </div>
+                    )}
+
                     <div className="modal-actions">
                         <button className="btn-primary" onClick={onClose}>Close View</button>
                     </div>
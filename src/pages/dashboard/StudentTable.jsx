@@ -2,28 +2,14 @@ import React, { useState } from 'react';
 import './DashboardComponents.css';
 import StudentDetailModal from './StudentDetailModal';
 
-const StudentTable = ({ students = [] }) => {
-    const [searchTerm, setSearchTerm] = useState('');
-    const [filterSubject, setFilterSubject] = useState('All');
-    const [filterDept, setFilterDept] = useState('All');
-    const [filterRisk, setFilterRisk] = useState('All');
+// Filtering happens on the server: the parent refetches when onFiltersChange fires
+const StudentTable = ({ students = [], filters = {}, departments = [], onFiltersChange = () => {} }) => {
     const [selectedStudent, setSelectedStudent] = useState(null);
 
     // Safety guard
     const safeStudents = Array.isArray(students) ? students : [];
-
-    const filteredStudents = safeStudents.filter(student => {
-        const matchesSearch = student.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-            student.student_id.toLowerCase().includes(searchTerm.toLowerCase());
-        const matchesDept = filterDept === 'All' || student.department === filterDept;
-        const matchesRisk = filterRisk === 'All' ||
-            (student.risk_level && student.risk_level.toLowerCase() === filterRisk.toLowerCase());
-        const matchesSubject = filterSubject === 'All' || student.subject_name === filterSubject;
-        return matchesSearch && matchesDept && matchesRisk && matchesSubject;
-    });
-
-    const departments = ['All', ...new Set(safeStudents.map(s => s.department))];
-    const subjects = ['All', ...new Set(safeStudents.map(s => s.subject_name).filter(Boolean))];
+    const showSubject = safeStudents.some(s => s.subject_name);
+    const setFilter = (key, value) => onFiltersChange({ ...filters, [key]: value });
 
     return (
         <div className="student-table-section">
@@ -32,21 +18,19 @@ const StudentTable = ({ students = [] }) => {
                     <input
                         type="text"
                         placeholder="Search by ID or Name..."
-                        value={searchTerm}
-                        onChange={(e) => setSearchTerm(e.target.value)}
+                        value={filters.q || ''}
+                        onChange={(e) => setFilter('q', e.target.value)}
                     />
                 </div>
                 <div className="filters">
-                    {subjects.length > 1 && (
-                        <select value={filterSubject} onChange={(e) => setFilterSubject(e.target.value)}>
-                            {subjects.map(sub => <option key={sub} value={sub}>{sub === 'All' ? 'All Subjects' : sub}</option>)}
+                    {departments.length > 0 && (
+                        <select value={filters.department || ''} onChange={(e) => setFilter('department', e.target.value)}>
+                            <option value="">All Dept</option>
+                            {departments.map(dept => <option key={dept} value={dept}>{dept + ' Dept'}</option>)}
                         </select>
                     )}
-                    <select value={filterDept} onChange={(e) => setFilterDept(e.target.value)}>
-                        {departments.map(dept => <option key={dept} value={dept}>{dept === 'All' ? 'All Dept' : dept + ' Dept'}</option>)}
-                    </select>
-                    <select value={filterRisk} onChange={(e) => setFilterRisk(e.target.value)}>
-                        <option value="All">All Risk</option>
+                    <select value={filters.risk_level || ''} onChange={(e) => setFilter('risk_level', e.target.value)}>
+                        <option value="">All Risk</option>
                         <option value="Low">Low Risk</option>
                         <option value="Medium">Medium</option>
                         <option value="High">High Risk</option>
@@ -60,7 +44,7 @@ const StudentTable = ({ students = [] }) => {
                         <tr>
                             <th>ID</th>
                             <th>Name</th>
-                            {subjects.length > 1 && <th>Subject</th>}
+                            {showSubject && <th>Subject</th>}
                             <th>Department</th>
                             <th>Sem</th>
                             <th>Attendance</th>
@@ -70,7 +54,7 @@ const StudentTable = ({ students = [] }) => {
                         </tr>
                     </thead>
                     <tbody>
-                        {filteredStudents.map((student, index) => (
+                        {safeStudents.map((student, index) => (
                             <tr key={`${student.student_id}-${student.subject_name || index}`} onClick={() => setSelectedStudent(student)}>
                                 <td className="st-id">#{index + 1}</td>
                                 <td>
@@ -84,7 +68,7 @@ const StudentTable = ({ students = [] }) => {
                                         </div>
                                     </div>
                                 </td>
-                                {subjects.length > 1 && <td>{student.subject_name || '-'}</td>}
+                                {showSubject && <td>{student.subject_name || '-'}</td>}
                                 <td>
                                     <span className="status-badge status-secondary">{student.department}</span>
                                 </td>
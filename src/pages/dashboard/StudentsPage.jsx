@@ -1,33 +1,71 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import StudentTable from './StudentTable';
 import './DashboardHome.css';
-import { getDashboardStudents } from '../../services/api';
+import { getDashboardStudents, getDashboardSummary } from '../../services/api';
+
+const PAGE_SIZE = 50;
+const SEARCH_DELAY_MS = 300;
 
 const StudentsPage = () => {
     const [students, setStudents] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [filters, setFilters] = useState({ q: '', department: '', risk_level: '' });
+    const [departments, setDepartments] = useState([]);
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [error, setError] = useState(null);
+    // Ignore responses to requests made before the filters last changed
+    const requestId = useRef(0);
 
-    useEffect(() => {
-        const fetchStudents = async () => {
-            try {
-                const data = await getDashboardStudents();
+    const fetchPage = async (cursor) => {
+        const id = ++requestId.current;
+        const data = await getDashboardStudents({ ...filters, limit: PAGE_SIZE, cursor });
+        if (id !== requestId.current) return;
+        if (data.error) {
+            setError(data.error);
+            return;
+        }
+        const page = Array.isArray(data.students) ? data.students : [];
+        setStudents((prev) => (cursor ? [...prev, ...page] : page));
+        setNextCursor(data.next_cursor || null);
+    };
 
-                if (data.error) {
-                    setError(data.error);
-                } else {
-                    setStudents(Array.isArray(data.students) ? data.students : []);
+    useEffect(() => {
+        // Only admins get a department breakdown; faculty are already scoped to theirs
+        getDashboardSummary()
+            .then((summary) => {
+                if (Array.isArray(summary?.departments)) {
+                    setDepartments(summary.departments.map((d) => d.department).filter((d) => d !== 'Unassigned'));
                 }
+            })
+            .catch((err) => console.error('Error fetching departments:', err));
+    }, []);
+
+    useEffect(() => {
+        const timer = setTimeout(async () => {
+            try {
+                await fetchPage(null);
             } catch (err) {
                 console.error('Error fetching students:', err);
                 setError('Failed to load students.');
             } finally {
                 setLoading(false);
             }
-        };
+        }, filters.q ? SEARCH_DELAY_MS : 0);
+        return () => clearTimeout(timer);
+    }, [filters]);
 
-        fetchStudents();
-    }, []);
+    const handleLoadMore = async () => {
+        setLoadingMore(true);
+        try {
+            await fetchPage(nextCursor);
+        } catch (err) {
+            console.error('Error fetching students:', err);
+            setError('Failed to load students.');
+        } finally {
+            setLoadingMore(false);
+        }
+    };
 
     if (loading) {
         return (
@@ -52,10 +90,22 @@ const StudentsPage = () => {
                     <div className="panel-header">
                         <h3 className="panel-title">Student Academic Records</h3>
                         <span className="metric-footer" style={{ marginTop: 0 }}>
-                            Displaying {students.length} student{students.length !== 1 ? 's' : ''} assigned to your courses
+                            Displaying {students.length}{nextCursor ? '+' : ''} student{students.length !== 1 ? 's' : ''} assigned to your courses
                         </span>
                     </div>
-                    <StudentTable students={students} />
+                    <StudentTable
+                        students={students}
+                        filters={filters}
+                        departments={departments}
+                        onFiltersChange={setFilters}
+                    />
+                    {nextCursor && (
+                        <div style={{ display: 'flex', justifyContent: 'center', marginTop: '1rem' }}>
+                            <button className="btn-outline" onClick={handleLoadMore} disabled={loadingMore}>
+                                {loadingMore ? 'Loading...' : 'Load more students'}
+                            </button>
+                        </div>
+                    )}
                 </div>
             </div>
         </div>
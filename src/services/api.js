@@ -266,12 +266,34 @@ export const getFacultyProfile = async () => {
   return request('/dashboard/faculty-profile')
 }
 
-export const getDashboardStudents = async () => {
-  return request('/students')
+// params (all optional): department, semester, risk_level, q (name or ID prefix), sort ('recent' | 'risk'),
+// limit (default 50) and cursor. The response is one page; pass next_cursor back as cursor for the next.
+export const getDashboardStudents = async (params = {}) => {
+  const query = new URLSearchParams(
+    Object.entries(params).filter(([, value]) => value !== undefined && value !== null && value !== '')
+  ).toString()
+  return request(query ? `/students?${query}` : '/students')
 }
 
+// Poll a scoring job once a second for at most 10 minutes (the server's stale-job limit)
+const JOB_POLL_INTERVAL_MS = 1000
+const JOB_POLL_MAX_ATTEMPTS = 600
+
 export const runRiskPrediction = async () => {
-  return request('/ai/predict', { method: 'POST' })
+  const data = await request('/ai/predict', { method: 'POST' })
+  if (data.summary) return data
+
+  // No snapshot yet for this scope: wait for the background scoring job
+  let job = data
+  let attempts = 0
+  while (job.status === 'queued' || job.status === 'running') {
+    if (++attempts > JOB_POLL_MAX_ATTEMPTS) {
+      throw new Error('Risk analysis is taking too long. Please try again later.')
+    }
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS))
+    job = await request(`/ai/jobs/${job.job_id}`)
+  }
+  return request(`/ai/jobs/${job.job_id}/result`)
 }
 
 export const importStudents = async (formData) => {